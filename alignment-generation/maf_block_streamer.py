@@ -0,0 +1,162 @@
+"""
+Script title: maf_block_streamer.py
+Author: Emmarie Alexander
+Contact: emmarie.alexander@tamu.edu
+Date written: 18-October-2026
+Date last updated: 18-October-2026
+Purpose: Convert the reference-anchored MAF from cactus-hal2maf (e.g. cactus_HomSap_ref_consensus.maf) into per-region FASTA alignments for the phyloP and gene tree steps, without reading the whole MAF into memory.
+Each MAF block is processed on its own: columns where the reference has a gap are dropped, species that are missing from the block are filled with gaps, and reference bases that no block covers are filled with N (reference) and gaps (everyone else).
+Column i of a region's FASTA is therefore reference position region_start + i, which is what phyloP_FASTA_annotator.py expects for '--ref_start'.
+Blocks are grouped into regions of '--chunk_size' reference bases (use the same value as hal2maf's --chunkSize) and the regions are converted in parallel.
+
+Example usage:
+python maf_block_streamer.py --maf cactus_HomSap_ref_consensus.maf --reference Homo_sapiens --output_dir HomSap_regions --chunk_size 1000000 --threads 8
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+GAP = ord("-")
+COMPLEMENT = bytes.maketrans(b"ACGTNacgtn", b"TGCANtgcan")
+
+
+def species_from_src(src):
+    """MAF source names are 'Species.chromosome'; the species is everything before the first dot."""
+    return src.split(".", 1)[0]
+
+
+def index_maf(maf_file, reference, chunk_size):
+    """
+    One pass over the MAF to record every block's byte range, grouped into reference regions, plus all species seen.
+    Only the block boundaries and the reference 's' line are looked at; no alignment text is kept.
+    """
+    regions = {}
+    species = {}
+    with open(maf_file, "rb") as f:
+        block_start = None
+        ref_chrom = ref_pos = None
+        offset = 0
+        for line in f:
+            if line.startswith(b"a"):
+                block_start = offset
+                ref_chrom = ref_pos = None
+            elif line.startswith(b"s") and block_start is not None:
+                fields = line.split(None, 6)
+                name = fields[1].decode()
+                species[species_from_src(name)] = None
+                if ref_chrom is None and species_from_src(name) == reference:
+                    start, size, strand, src_size = int(fields[2]), int(fields[3]), fields[4], int(fields[5])
+                    # Blocks on the reverse strand are flipped, so group them by their forward-strand start
+                    ref_pos = start if strand == b"+" else src_size - start - size
+                    ref_chrom = name.split(".", 1)[1] if "." in name else name
+            elif not line.strip() and block_start is not None:
+                if ref_chrom is not None:
+                    regions.setdefault((ref_chrom, ref_pos // chunk_size), []).append((ref_pos, block_start, offset - block_start))
+                block_start = None
+            offset += len(line)
+        if block_start is not None and ref_chrom is not None:
+            regions.setdefault((ref_chrom, ref_pos // chunk_size), []).append((ref_pos, block_start, offset - block_start))
+    return regions, list(species)
+
+
+def parse_block(text, reference):
+    """Parse one MAF block into (reference start, {species: uint8 row}), flipping reverse-strand reference blocks."""
+    rows = {}
+    ref_start = None
+    reverse = False
+    for line in text.splitlines():
+        if not line.startswith(b"s"):
+            continue
+        fields = line.split()
+        species = species_from_src(fields[1].decode())
+        if species in rows:
+            continue  # Keep the first row if a species is duplicated in a block
+        if species == reference:
+            start, size, src_size = int(fields[2]), int(fields[3]), int(fields[5])
+            reverse = fields[4] == b"-"
+            ref_start = src_size - start - size if reverse else start
+        rows[species] = fields[6]
+
+    if reverse:
+        rows = {species: seq.translate(COMPLEMENT)[::-1] for species, seq in rows.items()}
+    return ref_start, {species: np.frombuffer(seq, dtype=np.uint8) for species, seq in rows.items()}
+
+
+def convert_region(maf_file, reference, species_names, region_name, blocks, output_dir):
+    """Convert one region's blocks into a reference-anchored FASTA. Runs in a worker process."""
+    pieces = {species: [] for species in species_names}
+    region_start = region_end = None
+    skipped = 0
+    with open(maf_file, "rb") as f:
+        for _, offset, length in sorted(blocks):
+            f.seek(offset)
+            ref_start, rows = parse_block(f.read(length), reference)
+            keep = rows[reference] != GAP
+            n_bases = int(keep.sum())
+
+            if region_start is None:
+                region_start = region_end = ref_start
+            elif ref_start < region_end:
+                skipped += 1  # Overlapping reference blocks would break the column-to-position mapping
+                continue
+            elif ref_start > region_end:
+                # Reference bases that no block covers
+                uncovered = ref_start - region_end
+                for species in species_names:
+                    pieces[species].append(b"N" * uncovered if species == reference else b"-" * uncovered)
+
+            for species in species_names:
+                row = rows.get(species)
+                pieces[species].append(row[keep].tobytes() if row is not None else b"-" * n_bases)
+            region_end = ref_start + n_bases
+
+    output_file = os.path.join(output_dir, f"{reference}_{region_name}_{region_start + 1}-{region_end}.fasta")
+    with open(output_file, "wb") as out:
+        for species in species_names:
+            out.write(f">{species}\n".encode())
+            out.write(b"".join(pieces[species]) + b"\n")
+    return output_file, len(blocks), region_end - region_start, skipped
+
+
+def main(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    print(f"Indexing {args.maf}...")
+    regions, species_names = index_maf(args.maf, args.reference, args.chunk_size)
+    if args.species_list:
+        with open(args.species_list, "r") as f:
+            species_names = [line.strip() for line in f if line.strip()]
+    if args.reference not in species_names:
+        raise ValueError(f"Reference '{args.reference}' was not found in the MAF.")
+    # Reference first, then everyone else in the order given or seen
+    species_names = [args.reference] + [species for species in species_names if species != args.reference]
+    print(f"Found {len(regions)} regions and {len(species_names)} species.")
+
+    with ProcessPoolExecutor(max_workers=args.threads) as pool:
+        futures = {
+            pool.submit(convert_region, args.maf, args.reference, species_names, f"{chrom}_chunk{chunk}", blocks, args.output_dir): (chrom, chunk)
+            for (chrom, chunk), blocks in sorted(regions.items())
+        }
+        for future in as_completed(futures):
+            output_file, n_blocks, n_columns, skipped = future.result()
+            print(f"Wrote {output_file}: {n_blocks} blocks, {n_columns} reference positions.")
+            if skipped:
+                print(f"Warning: {skipped} overlapping blocks were skipped in {output_file}.")
+
+    print(f"Process complete! Region FASTA files saved to {args.output_dir}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a reference-anchored MAF into per-region FASTA alignments with reference-gap columns removed.")
+    parser.add_argument("--maf", required=True, help="Path to the MAF produced by cactus-hal2maf.")
+    parser.add_argument("--reference", required=True, help="Reference species used for hal2maf's --refGenome, e.g. Homo_sapiens.")
+    parser.add_argument("--output_dir", required=True, help="Directory to write the per-region FASTA files to.")
+    parser.add_argument("--chunk_size", type=int, default=1000000, help="Reference bases per region; match hal2maf's --chunkSize (default: 1000000).")
+    parser.add_argument("--species_list", help="Optional text file of species (one per line) to include, in output order. Defaults to every species in the MAF.")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="Number of regions to convert in parallel (default: all cores).")
+
+    args = parser.parse_args()
+    main(args)
@@ -2,40 +2,120 @@
 # Author: Emmarie Alexander
 # Email: emmarie.alexander@tamu.edu
 # Date written: 5-Oct-2023
-# Date last updated: 28-May-2024
+# Date last updated: 18-Oct-2026
 
 ## ===================================README=========================================
-# This script was originally written to prune the Zoonomia 241-mammal phylogeny published by Foley et al. (2023). 
-# The script extracts taxa (or closely related taxa) and will be used as the guide tree for my Progressive Cactus alignment. 
+# This script was originally written to prune the Zoonomia 241-mammal phylogeny published by Foley et al. (2023).
+# The script extracts taxa (or closely related taxa) and will be used as the guide tree for my Progressive Cactus alignment.
 # This script preserves both internal and terminal branch lengths.
+#
+# The reference tree is read once into the array-based CompactTree from gene-conversion/compact_tree.py (add --cache to keep
+# a binary copy of the parsed Zoonomia tree, so later runs skip the parse). Each species list is then pruned in a single bottom-up pass:
+# leaves not in the list are dropped, internal nodes left with one child are collapsed into that child (their branch
+# lengths are summed), and the pruned tree is written straight to Newick. This avoids ete3's node.delete() per removed
+# leaf, which restructures the tree every time.
+# compact_tree.py is imported from ../gene-conversion/ (next to this folder in the repository) unless it is already on your PYTHONPATH.
+#
+# Single guide tree:
+#   python phylo-pruner.py --tree Concatenation_HRA_neutral_241_10miss_rooted.tr --species_list species_to_extract.txt --outfile guideTree.tr
+# Many guide trees at once (a directory of species lists, or a TSV manifest of "species_list<TAB>output_tree" rows):
+#   python phylo-pruner.py --tree Concatenation_HRA_neutral_241_10miss_rooted.tr --species_dir species_lists/ --output_dir guide_trees/ --threads 8
 
-from ete3 import Tree
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
-# Specify your starting tree - in this case, I'm using Foley's Zoonomia tree that was constructed from neutral sites scross the whole-genome and referenced to the human
-tree = Tree("/user/path/Concatenation_HRA_neutral_241_10miss_rooted.tr")
+try:
+    from compact_tree import load_tree
+except ImportError:
+    # compact_tree.py lives in gene-conversion/; fall back to the repository copy next to this folder
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "gene-conversion"))
+    from compact_tree import load_tree
 
-taxa_to_keep = []
+REFERENCE_TREE = None  # Set once per worker process so the reference tree is not re-sent with every species list
 
-# Replace the text file with a file that contains the names of the species you want to extract from the phylogeny, make sure species names are identical to the tree you're extracting from.
-with open("/user/path/species_to_extract.txt","r") as taxa_file:
-    for line in taxa_file:
-        taxa_to_keep.append(line.strip())
 
-# Create a list of nodes to prune
-nodes_to_prune = []
+def set_worker_tree(tree):
+    global REFERENCE_TREE
+    REFERENCE_TREE = tree
 
-for leaf in tree:
-    if leaf.name not in taxa_to_keep:
-        nodes_to_prune.append(leaf)
 
-# Prune the specified nodes
-for node in nodes_to_prune:
-    node.delete(preserve_branch_length=True) # you can set preserve_branch_length to false if you're not interesting in maintaining branch lengths, but that shouldn't be necessary
+def read_taxa(species_list):
+    # Make sure species names are identical to the tree you're extracting from
+    with open(species_list, "r") as taxa_file:
+        return {line.strip() for line in taxa_file if line.strip()}
 
-outfile = "guideTree.tr"  # Make sure to rename your output tree!
 
-# outputs the pruned tree
-tree.write(outfile=outfile, format=1) # you can change the format depending on what you're interested in. if you want to retain bootstrap values, change format = 0. if you just want branch lengths, change to format = 1
+def prune_species_list(species_list, outfile):
+    """Prune the worker's reference tree to one species list and write the guide tree."""
+    taxa_to_keep = read_taxa(species_list)
+    missing = taxa_to_keep.difference(REFERENCE_TREE.leaf_names())
+    with open(outfile, "w") as out:
+        out.write(REFERENCE_TREE.prune(taxa_to_keep).to_newick() + "\n")
+    return outfile, len(taxa_to_keep) - len(missing), sorted(missing)
 
-# Print when completed
-print(f"Pruned tree with preserved branch lengths saved to {outfile}")
+
+def read_manifest(manifest):
+    """Read 'species_list<TAB>output_tree' rows, skipping blank and '#' lines."""
+    jobs, bad_lines = [], []
+    with open(manifest, "r") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip() or line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 2 or not fields[0].strip() or not fields[1].strip():
+                bad_lines.append(line_number)
+                continue
+            jobs.append((fields[0].strip(), fields[1].strip()))
+    if bad_lines:
+        raise ValueError(f"{manifest}: lines {bad_lines[:10]} need a species list and an output tree separated by a tab.")
+    return jobs
+
+
+def gather_jobs(args):
+    """List (species_list, output_tree) pairs from --species_list, --species_dir or --manifest."""
+    if args.species_list:
+        return [(args.species_list, args.outfile)]
+    if args.manifest:
+        return read_manifest(args.manifest)
+    os.makedirs(args.output_dir, exist_ok=True)
+    return [
+        (os.path.join(args.species_dir, name), os.path.join(args.output_dir, f"{os.path.splitext(name)[0]}_guideTree.tr"))
+        for name in sorted(os.listdir(args.species_dir)) if name.endswith(".txt")
+    ]
+
+
+def main(args):
+    # Specify your starting tree - in this case, I'm using Foley's Zoonomia tree that was constructed from neutral sites scross the whole-genome and referenced to the human
+    tree = load_tree(args.tree, use_cache=args.cache)
+    jobs = gather_jobs(args)
+
+    if len(jobs) == 1:
+        set_worker_tree(tree)
+        results = [prune_species_list(*jobs[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=args.threads, initializer=set_worker_tree, initargs=(tree,)) as pool:
+            results = list(pool.map(prune_species_list, *zip(*jobs)))
+
+    for outfile, n_taxa, missing in results:
+        # Print when completed
+        print(f"Pruned tree with preserved branch lengths ({n_taxa} taxa) saved to {outfile}")
+        if missing:
+            print(f"  Warning: not found in the tree and skipped: {', '.join(missing)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prune a reference phylogeny to one or many species lists, preserving branch lengths.")
+    parser.add_argument("--tree", required=True, help="Reference tree to prune, e.g. the Zoonomia 241-mammal tree.")
+    jobs = parser.add_mutually_exclusive_group(required=True)
+    jobs.add_argument("--species_list", help="Text file with one species per line to keep (single guide tree).")
+    jobs.add_argument("--species_dir", help="Directory of species list .txt files; one guide tree is written per list.")
+    jobs.add_argument("--manifest", help="TSV of 'species_list<TAB>output_tree' rows.")
+    parser.add_argument("--outfile", default="guideTree.tr", help="Output tree for --species_list (default: guideTree.tr). Make sure to rename your output tree!")
+    parser.add_argument("--output_dir", default="guide_trees", help="Output directory for --species_dir (default: guide_trees).")
+    parser.add_argument("--cache", action="store_true", help="Keep a binary copy of the parsed reference tree (see compact_tree.py) so later runs skip the parse.")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="Number of species lists to prune in parallel (default: all cores).")
+
+    args = parser.parse_args()
+    main(args)
@@ -1,25 +1,169 @@
 ## Author: Emmarie P. Alexander
 ## Date: March 2023
+## Date last updated: October 2026
 ## Purpose: This Python script can be used to download coding sequences from NCBI for certain genes specified by the user via an input .txt file
+## Update (Oct-2026): Accessions are now fetched in batches (one efetch call for many IDs) by a small pool of concurrent requests that stays under NCBI's rate limit
+## (3 requests/second, or 10 with an API key) and retries with exponential backoff. Every accession's download is cached in --cache_dir, so reruns only fetch what's missing.
+## The E-utilities base URL can be changed with --base_url (e.g. to test against a local server). Each accession now gets its own output file (previously only the last one was written).
+##
+## Example usage:
+## python CDS_from_ncbiEntrez.py --accessions accessions.txt --email user@tamu.edu --output_dir CDS --threads 3 --batch_size 200
+
+import argparse
+import http.client
+import io
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import Bio
-from Bio import Entrez
 from Bio import SeqIO
 
-# set email for NCBI Entrez usage
-Entrez.email = 'user@tamu.edu
+NCBI_EUTILS = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# Dropped or truncated connections, the usual transient efetch failures besides HTTP errors (RemoteDisconnected is a ConnectionResetError)
+RETRY_ERRORS = (urllib.error.URLError, TimeoutError, ConnectionError, http.client.IncompleteRead, http.client.RemoteDisconnected)
+
+
+class RateLimiter:
+    """Spaces out request start times across threads so at most `per_second` requests start each second."""
+
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second
+        self.lock = threading.Lock()
+        self.next_start = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+
+def unversioned(accession):
+    return accession.split(".")[0]
+
+
+def record_accession(record):
+    # fasta_cds_na headers look like ">lcl|NM_001356.5_cds_NP_001347.3_1 [gene=DDX3X] ..."; the nucleotide accession is before "_cds_"
+    return unversioned(record.id.split("|")[-1].split("_cds_")[0])
+
+
+def efetch_batch(accessions, args, limiter):
+    """One efetch call for a batch of accessions, retried with exponential backoff. Returns the FASTA text."""
+    params = {"db": args.db, "id": ",".join(accessions), "rettype": args.rettype, "retmode": "text", "tool": "phylogen-y", "email": args.email}
+    if args.api_key:
+        params["api_key"] = args.api_key
+    data = urllib.parse.urlencode(params).encode()
+    url = args.base_url.rstrip("/") + "/efetch.fcgi"
+
+    for attempt in range(args.retries + 1):
+        limiter.wait()
+        try:
+            # POST, so long ID lists don't run into URL length limits
+            with urllib.request.urlopen(url, data=data, timeout=args.timeout) as response:
+                return response.read().decode()
+        except urllib.error.HTTPError as e:
+            if e.code not in RETRY_STATUS or attempt == args.retries:
+                raise
+        except RETRY_ERRORS:
+            if attempt == args.retries:
+                raise
+        time.sleep(args.backoff * 2 ** attempt)
+
+
+def cache_file(cache_dir, accession):
+    return os.path.join(cache_dir, f"{accession}.fasta")
+
+
+def fetch_and_cache(accessions, args, limiter):
+    """Fetch one batch and cache each accession's records separately. Returns the accessions NCBI returned nothing for."""
+    text = efetch_batch(accessions, args, limiter)
+    by_accession = {}
+    for record in SeqIO.parse(io.StringIO(text), "fasta"):
+        by_accession.setdefault(record_accession(record), []).append(record)
+
+    missing = []
+    for accession in accessions:
+        records = by_accession.get(unversioned(accession))
+        if not records:
+            missing.append(accession)
+            continue
+        # Write to a temporary file first so an interrupted run never leaves a partial cache entry
+        tmp_file = cache_file(args.cache_dir, accession) + ".tmp"
+        with open(tmp_file, "w") as out:
+            SeqIO.write(records, out, "fasta")
+        os.replace(tmp_file, cache_file(args.cache_dir, accession))
+    return missing
+
+
+def write_output(accession, args):
+    records = list(SeqIO.parse(cache_file(args.cache_dir, accession), "fasta"))
+    for record in records:
+        organism = record.description.split("[")[1].split("]")[0] if "[" in record.description else ""
+        record.description = f'{record.description}[{organism}]'
+
+    # adjust the names of output files
+    codingSeqs = os.path.join(args.output_dir, f'{accession}.fasta')
+    SeqIO.write(records, codingSeqs, 'fasta')
+
+
+def main(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    os.makedirs(args.cache_dir, exist_ok=True)
+
+    # provide a text file that lists the accessions of what genes you would like the coding sequence for
+    with open(args.accessions, 'r') as f:
+        accessions = list(dict.fromkeys(line.strip() for line in f if line.strip()))
+
+    to_fetch = [accession for accession in accessions if not os.path.exists(cache_file(args.cache_dir, accession))]
+    print(f"{len(accessions)} accessions: {len(accessions) - len(to_fetch)} already cached, {len(to_fetch)} to download.")
+
+    limiter = RateLimiter(args.requests_per_second or (10 if args.api_key else 3))
+    batches = [to_fetch[i:i + args.batch_size] for i in range(0, len(to_fetch), args.batch_size)]
+    missing, failed = [], []
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        futures = {pool.submit(fetch_and_cache, batch, args, limiter): batch for batch in batches}
+        for future in as_completed(futures):
+            try:
+                missing.extend(future.result())
+            except Exception as e:
+                failed.extend(futures[future])
+                print(f"Batch starting with {futures[future][0]} failed: {e}")
+
+    written = 0
+    for accession in accessions:
+        if os.path.exists(cache_file(args.cache_dir, accession)):
+            write_output(accession, args)
+            written += 1
 
-# provide a text file that lists the accessions of what genes you would like the coding sequence for
-with open('accessions.txt','r') as f:
-    accessions = [line.strip() for line in f.readlines()]
+    if missing:
+        print(f"No coding sequences were returned for: {', '.join(missing)}")
+    if failed:
+        print(f"{len(failed)} accessions could not be downloaded; rerun to retry them.")
+    print(f"Coding sequences for {written} accessions saved to {args.output_dir}.")
 
 
-for accession in accessions:
-    handle = Entrez.efetch(db='nuccore', id=accession, rettype='fasta_cds_na', retmode='text')
-    record = SeqIO.read(handle, 'fasta')
-    organism = record.description.split("[")[1].split("]")[0]
-    record.description = f'{record.description}[{organism}]'
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download coding sequences for a list of NCBI accessions, in cached, rate-limited batches.")
+    parser.add_argument("--accessions", default="accessions.txt", help="Text file with one accession per line (default: accessions.txt).")
+    parser.add_argument("--email", required=True, help="Email address for NCBI Entrez usage.")
+    parser.add_argument("--api_key", default=os.environ.get("NCBI_API_KEY"), help="NCBI API key (default: $NCBI_API_KEY); raises the rate limit to 10 requests/second.")
+    parser.add_argument("--output_dir", default=".", help="Directory for the per-accession FASTA files (default: current directory).")
+    parser.add_argument("--cache_dir", default="ncbi_cache", help="Directory where downloads are cached by accession (default: ncbi_cache).")
+    parser.add_argument("--db", default="nuccore", help="Entrez database (default: nuccore).")
+    parser.add_argument("--rettype", default="fasta_cds_na", help="efetch rettype (default: fasta_cds_na).")
+    parser.add_argument("--batch_size", type=int, default=200, help="Accessions per efetch call (default: 200).")
+    parser.add_argument("--threads", type=int, default=3, help="Concurrent requests (default: 3).")
+    parser.add_argument("--requests_per_second", type=float, help="Request rate limit (default: 3, or 10 with an API key).")
+    parser.add_argument("--retries", type=int, default=4, help="Retries per batch on network errors or HTTP 429/5xx (default: 4).")
+    parser.add_argument("--backoff", type=float, default=1.0, help="Initial retry delay in seconds, doubled after each attempt (default: 1).")
+    parser.add_argument("--timeout", type=float, default=120, help="Request timeout in seconds (default: 120).")
+    parser.add_argument("--base_url", default=NCBI_EUTILS, help=f"E-utilities base URL (default: {NCBI_EUTILS}).")
 
-# adjust the names of output files
-codingSeqs = f'{accession}.fasta'
-SeqIO.write(record, codingSeqs, 'fasta')
+    args = parser.parse_args()
+    main(args)
@@ -1,28 +1,135 @@
 ## Author: Emmarie Alexander
+## Date last updated: October 2026
 ## Purpose: Extract certain regions from a chromosome, such as extracting certain genes based on their start and end position, and store it into a new FASTA file.
+## Update (Oct-2026): The genome is no longer parsed once per gene. A samtools-compatible .fai index (name, length, byte offset, bases per line, bytes per line) is built once
+## (or reused if it's already next to the FASTA), the FASTA is memory-mapped, and each region is read straight from its byte range, so a region costs about its own size.
+## Regions come from a BED file (chrom, start, end, name, score, strand; 0-based, end-exclusive) and can span every sequence in a multi-sequence genome;
+## regions on the '-' strand are reverse-complemented. Regions are written out one at a time as they are read.
+##
+## Example usage:
+## python extract_regions_from_fasta.py --fasta input_chromosome_masked.fna --bed genes.bed --output genes_fromChromosome_masked.fna
 
-from Bio import SeqIO
+import argparse
+import mmap
+import os
 
-def extract_genomic_region(fasta_file, start_pos, end_pos):
-    # Read the FASTA file
-    sequence = SeqIO.read(fasta_file, "fasta").seq
+COMPLEMENT = bytes.maketrans(b"ACGTRYKMBVDHNacgtrykmbvdhn", b"TGCAYRMKVBHDNtgcayrmkvbhdn")
+
+
+def build_fai(fasta_file, fai_file=None):
+    """Write a samtools faidx-compatible index for an uncompressed FASTA and return its entries."""
+    fai_file = fai_file or f"{fasta_file}.fai"
+    entries = []
+    name = None
+    with open(fasta_file, "rb") as f:
+        offset = 0
+        for line in f:
+            line_length = len(line)
+            if line.startswith(b">"):
+                name = line[1:].split()[0].decode()
+                entries.append([name, 0, offset + line_length, 0, 0, False])  # name, length, offset, line bases, line width, seen a short line
+            elif name is not None:
+                bases = len(line.rstrip(b"\r\n"))
+                entry = entries[-1]
+                if bases:
+                    if entry[3] == 0:
+                        entry[3], entry[4] = bases, line_length
+                    elif entry[5] or bases > entry[3]:
+                        raise ValueError(f"{fasta_file}: sequence '{name}' has lines of different lengths, so it can't be indexed.")
+                    entry[5] = entry[5] or bases < entry[3]
+                    entry[1] += bases
+            offset += line_length
+
+    with open(fai_file, "w") as out:
+        for name, length, offset, line_bases, line_width, _ in entries:
+            out.write(f"{name}\t{length}\t{offset}\t{line_bases}\t{line_width}\n")
+    return read_fai(fai_file)
+
+
+def read_fai(fai_file):
+    index = {}
+    with open(fai_file, "r") as f:
+        for line in f:
+            name, length, offset, line_bases, line_width = line.rstrip("\n").split("\t")[:5]
+            index[name] = (int(length), int(offset), int(line_bases), int(line_width))
+    return index
+
+
+def load_index(fasta_file):
+    """Reuse the FASTA's .fai if it is newer than the FASTA, otherwise (re)build it."""
+    if fasta_file.endswith(".gz"):
+        raise ValueError("Random access needs an uncompressed FASTA; decompress it first (gunzip).")
+    fai_file = f"{fasta_file}.fai"
+    if os.path.exists(fai_file) and os.path.getmtime(fai_file) >= os.path.getmtime(fasta_file):
+        return read_fai(fai_file)
+    print(f"Indexing {fasta_file}...")
+    return build_fai(fasta_file, fai_file)
+
+
+def fetch_region(genome, entry, start, end):
+    """Bases start..end (0-based, end-exclusive) of one indexed sequence, read from the memory-mapped FASTA."""
+    length, offset, line_bases, line_width = entry
+    start, end = max(0, start), min(end, length)
+    if start >= end:
+        return b""
+    first = offset + (start // line_bases) * line_width + start % line_bases
+    last = offset + ((end - 1) // line_bases) * line_width + (end - 1) % line_bases + 1
+    return genome[first:last].replace(b"\n", b"").replace(b"\r", b"")
+
+
+def reverse_complement(sequence):
+    return sequence.translate(COMPLEMENT)[::-1]
+
+
+def read_bed(bed_file):
+    """Yield (chrom, start, end, name, strand) from a BED file; name defaults to chrom:start-end and strand to '+'."""
+    with open(bed_file, "r") as f:
+        for line in f:
+            if not line.strip() or line.startswith(("#", "track", "browser")):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            chrom, start, end = fields[0], int(fields[1]), int(fields[2])
+            name = fields[3] if len(fields) > 3 and fields[3] else f"{chrom}:{start + 1}-{end}"
+            strand = fields[5] if len(fields) > 5 else "+"
+            yield chrom, start, end, name, strand
+
+
+def extract_genomic_region(fasta_file, start_pos, end_pos, chrom=None):
+    """1-based, inclusive region of one sequence (the first one if chrom isn't given), read through the index."""
+    index = load_index(fasta_file)
+    entry = index[chrom] if chrom else next(iter(index.values()))
+    with open(fasta_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as genome:
+        return fetch_region(genome, entry, start_pos - 1, end_pos).decode()
+
+
+def extract_regions(fasta_file, bed_file, output_fasta, line_width=0):
+    index = load_index(fasta_file)
+    n_regions, missing = 0, set()
+    with open(fasta_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as genome, open(output_fasta, "wb") as output_handle:
+        for chrom, start, end, name, strand in read_bed(bed_file):
+            if chrom not in index:
+                missing.add(chrom)
+                continue
+            sequence = fetch_region(genome, index[chrom], start, end)
+            if strand == "-":
+                sequence = reverse_complement(sequence)
+            output_handle.write(f">{name}\n".encode())
+            if line_width:
+                output_handle.writelines(sequence[i:i + line_width] + b"\n" for i in range(0, len(sequence), line_width))
+            else:
+                output_handle.write(sequence + b"\n")
+            n_regions += 1
+    if missing:
+        print(f"Warning: these sequences are not in {fasta_file} and their regions were skipped: {', '.join(sorted(missing))}")
+    print(f"{n_regions} regions extracted to {output_fasta}.")
 
-    # Extract the sequence for the specified genomic positions
-    return sequence[start_pos - 1:end_pos]
 
 if __name__ == "__main__":
-    # Specify the input FASTA file, gene information, and output file
-    input_fasta = "/user/path/input_chromosome_masked.fna"
-    output_fasta = "/user/path/output_3genes_fromChromosome_masked.fna"
-
-    gene_info = [
-        {"gene_name": "gene1", "start_position": 14140601, "end_position": 14387359, "output_file": "gene1.fasta"},
-        {"gene_name": "gene2", "start_position": 13609504, "end_position": 13769113, "output_file": "gene2.fasta"},
-        {"gene_name": "gene3", "start_position": 13812270, "end_position": 13828749, "output_file": "gene3.fasta"}
-    ]
-
-    # Extract the gene sequences and append to a single output FASTA file
-    with open(output_fasta, "w") as output_handle:
-        for gene_data in gene_info:
-            gene_sequence = extract_genomic_region(input_fasta, gene_data["start_position"], gene_data["end_position"])
-            output_handle.write(f">{gene_data['gene_name']}\n{gene_sequence}\n")
+    parser = argparse.ArgumentParser(description="Extract BED regions from an indexed, memory-mapped FASTA.")
+    parser.add_argument("--fasta", required=True, help="Input genome or chromosome FASTA (uncompressed); a .fai index is created next to it if needed.")
+    parser.add_argument("--bed", required=True, help="BED file of regions: chrom, start, end, and optionally name, score and strand.")
+    parser.add_argument("--output", required=True, help="Output FASTA with one record per region.")
+    parser.add_argument("--line_width", type=int, default=0, help="Wrap output sequences at this many bases (default: 0, one line per sequence).")
+
+    args = parser.parse_args()
+    extract_regions(args.fasta, args.bed, args.output, args.line_width)
@@ -1,41 +1,124 @@
 ## Author: Emmarie Alexander
 ## Date: July 2023
+## Date last updated: October 2026
 ## Purpose: This script was written to remove user-specified regions from a FASTA file. In particular, I wrote this script to remove all of the pseudogenes for USP9Y from the Homo sapiens T2T Y-chromosome.
+## Update (Oct-2026): Regions are now given per sequence as a BED file (chrom, start, end; 0-based, end-exclusive, all in the original coordinates) instead of one start/end list applied to every record.
+## Each sequence's regions are sorted and merged, and the sequence is rebuilt in one pass by writing out the slices between them straight from the memory-mapped FASTA
+## (indexed with the same .fai as extract_regions_from_fasta.py). Previously every cut copied the whole sequence and shifted the coordinates of the regions after it.
+## Records are streamed to the output one at a time. '--liftover' writes a table of the kept blocks with their old and new coordinates.
+##
+## Example usage:
+## python remove_regions_from_fasta.py --input HomSap_T2T_Ychr.fasta --bed USP9Y_pseudogenes.bed --output HomSap_T2T_Ychr_USP9Y_pseudogenes_removed.fasta --liftover USP9Y_removed_liftover.tsv
 
-from Bio import SeqIO
-from Bio.Seq import Seq
-from Bio.SeqRecord import SeqRecord
+import argparse
+import mmap
+
+from extract_regions_from_fasta import fetch_region, load_index
+
+CHUNK_SIZE = 1 << 20  # Kept slices are copied in pieces of this many bases so long slices never sit in memory whole
+
+
+def merge_intervals(intervals):
+    """Sort and merge overlapping or touching (start, end) intervals."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
 
-def remove_regions(sequence, regions_to_remove):
-    for start, end in regions_to_remove:
-        sequence = sequence[:start-1] + sequence[end:]
-    return sequence
 
 def read_regions_from_file(file_path):
-    regions_to_remove = []
+    """Read a BED file into {sequence: merged list of (start, end)}."""
+    regions = {}
     with open(file_path, "r") as file:
         for line in file:
-            start, end = map(int, line.strip().split('\t'))
-            regions_to_remove.append((start, end))
-    return regions_to_remove
+            if not line.strip() or line.startswith(("#", "track", "browser")):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            regions.setdefault(fields[0], []).append((int(fields[1]), int(fields[2])))
+    return {chrom: merge_intervals(intervals) for chrom, intervals in regions.items()}
+
+
+def kept_blocks(length, regions_to_remove):
+    """The (start, end) slices of a sequence of this length that are left after removing the merged regions."""
+    blocks = []
+    position = 0
+    for start, end in regions_to_remove:
+        start, end = max(0, start), min(length, end)
+        if start > position:
+            blocks.append((position, start))
+        position = max(position, end)
+    if position < length:
+        blocks.append((position, length))
+    return blocks
+
+
+def header_line(genome, offset):
+    """The full header line (without '>') of the sequence whose bases start at this byte offset."""
+    # The header line starts after the newline before it (a '>' can also appear inside the description)
+    header_start = genome.rfind(b"\n", 0, offset - 1) + 1
+    return genome[header_start + 1:offset].rstrip(b"\r\n")
+
 
-def main():
-    input_file = "/path/to/input_file.fasta" # change this to the path of your input FASTA file that you want regions stripped from
-    output_file = "/path/to/output_file.fasta" # change this an informative FASTA file titled appropriately, e.g. "HomSap_T2T_Ychr_USP9Y_pseudogenes_removed.fasta"
-    regions_file = "/path/to/regions_to_be_removed.fasta" # change this to the path of a text file that contains start and end coordinates for the regions you want to remove
+def write_sequence(output_handle, genome, entry, blocks, line_width):
+    """Write the kept blocks of one sequence, wrapped at line_width (0 writes the sequence on one line)."""
+    pending = b""
+    for block_start, block_end in blocks:
+        for chunk_start in range(block_start, block_end, CHUNK_SIZE):
+            chunk = fetch_region(genome, entry, chunk_start, min(chunk_start + CHUNK_SIZE, block_end))
+            if not line_width:
+                output_handle.write(chunk)
+                continue
+            pending += chunk
+            n_full = len(pending) // line_width * line_width
+            output_handle.writelines(pending[i:i + line_width] + b"\n" for i in range(0, n_full, line_width))
+            pending = pending[n_full:]
+    if pending or (not line_width and blocks):
+        output_handle.write(pending + b"\n")
 
-    # Read regions from the file
-    regions_to_remove = read_regions_from_file(regions_file)
 
-    records = []
-    with open(input_file, "r") as handle:
-        for record in SeqIO.parse(handle, "fasta"):
-            sequence = remove_regions(str(record.seq), regions_to_remove)
-            new_record = SeqRecord(Seq(sequence), id=record.id, description=record.description)
-            records.append(new_record)
+def remove_regions(input_file, regions_file, output_file, liftover_file=None, line_width=60):
+    index = load_index(input_file)
+    regions = read_regions_from_file(regions_file)
+    missing = sorted(set(regions) - set(index))
+    if missing:
+        print(f"Warning: these sequences are not in {input_file} and their regions were skipped: {', '.join(missing)}")
+
+    liftover = open(liftover_file, "w") if liftover_file else None
+    try:
+        if liftover:
+            liftover.write("chrom\told_start\told_end\tnew_start\tnew_end\n")
+        with open(input_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as genome, open(output_file, "wb") as output_handle:
+            for name, entry in index.items():
+                length = entry[0]
+                blocks = kept_blocks(length, regions.get(name, []))
+                output_handle.write(b">" + header_line(genome, entry[1]) + b"\n")
+                write_sequence(output_handle, genome, entry, blocks, line_width)
+
+                removed = length - sum(end - start for start, end in blocks)
+                if liftover:
+                    new_start = 0
+                    for block_start, block_end in blocks:
+                        new_end = new_start + block_end - block_start
+                        liftover.write(f"{name}\t{block_start}\t{block_end}\t{new_start}\t{new_end}\n")
+                        new_start = new_end
+                if removed:
+                    print(f"{name}: removed {removed} bp in {len(regions[name])} merged regions ({length} -> {length - removed} bp).")
+    finally:
+        if liftover:
+            liftover.close()
+    print(f"Sequences with regions removed saved to {output_file}.")
 
-    with open(output_file, "w") as output_handle:
-        SeqIO.write(records, output_handle, "fasta")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Remove BED regions from each sequence of a FASTA file in a single streaming pass.")
+    parser.add_argument("--input", required=True, help="Input FASTA file (uncompressed) that you want regions stripped from.")
+    parser.add_argument("--bed", required=True, help="BED file of regions to remove: sequence ID, start, end (0-based, end-exclusive, original coordinates).")
+    parser.add_argument("--output", required=True, help="Output FASTA, e.g. HomSap_T2T_Ychr_USP9Y_pseudogenes_removed.fasta.")
+    parser.add_argument("--liftover", help="Optional TSV of kept blocks with their old and new (0-based, end-exclusive) coordinates.")
+    parser.add_argument("--line_width", type=int, default=60, help="Bases per output line (default: 60; 0 writes each sequence on one line).")
+
+    args = parser.parse_args()
+    remove_regions(args.input, args.bed, args.output, args.liftover, args.line_width)
@@ -2,39 +2,113 @@
 Script title: gap_remover_phyloP.py
 Author: Emmarie Alexander
 Date written: 10-December-2024
-Date last updated: 10-December-2024
+Date last updated: 18-October-2026
 Purpose: For calculating phyloP scores, you must choose a reference species or sequence. PhyloP scores will not be calculated at any position where a gap is present. This script takes a reference species and removes any sites in the alignment where there is a gap at that site in the reference species.
+Notes: The gap mask is built once from the reference sequence(s) and then applied to each record as it is streamed to the output, so only the reference rows are held in memory.
+More than one reference can be given. With '--mode union' a site is kept if at least one reference has a base there; with '--mode intersection' it is kept only if every reference has a base.
+Use '--coords_file' to also write a TSV mapping each kept column to its original alignment column and to the (1-based, ungapped) position in each reference, so phyloP scores can be projected back onto the genome.
+
+Example usage:
+python gap_remover_phyloP.py --input_file input_alignment.fasta --reference Bos_taurus --output_file alignment_gapsRemoved.fasta
 """
-from Bio import SeqIO
-from Bio import AlignIO
-from Bio.Seq import Seq
-from Bio.Align import MultipleSeqAlignment
-
-def remove_gaps_by_reference(input_file, reference_name, output_file):
-    alignment = AlignIO.read(input_file, "fasta")
-
-    # Find the reference sequence index
-    reference_index = None
-    for i, record in enumerate(alignment):
-        if record.id == reference_name:
-            reference_index = i
-            break
-
-    if reference_index is None:
-        raise ValueError(f"Reference sequence '{reference_name}' not found in the input file.")
-
-    # Create a new alignment with gaps removed
-    new_alignment = MultipleSeqAlignment([])
-    for record in alignment:
-        # Create a new sequence with gaps removed
-        new_seq = ''.join(base for i, base in enumerate(record.seq) if alignment[reference_index].seq[i] != '-')
-        new_alignment.append(SeqIO.SeqRecord(Seq(new_seq), id=record.id, description=record.description))
-
-    AlignIO.write(new_alignment, output_file, "fasta")
-
-# Example usage:
-input_file = "/user/path/input_alignment.fasta"
-reference_name = "Bos_taurus"
-output_file = "/user/path/alignment_gapsRemoved.fasta"
-
-remove_gaps_by_reference(input_file, reference_name, output_file)
+import argparse
+import numpy as np
+from Bio.SeqIO.FastaIO import SimpleFastaParser
+
+GAP = ord("-")
+LINE_WIDTH = 60  # Same line width Biopython uses when writing FASTA
+COORDS_CHUNK = 1 << 18  # Alignment columns per block of the coordinate map
+
+
+def read_reference_rows(input_file, reference_names):
+    """First pass over the alignment: keep only the reference sequences, as byte arrays."""
+    reference_rows = {}
+    with open(input_file, "r") as handle:
+        for title, seq in SimpleFastaParser(handle):
+            record_id = title.split(None, 1)[0] if title else ""
+            if record_id in reference_names and record_id not in reference_rows:
+                reference_rows[record_id] = np.frombuffer(seq.encode(), dtype=np.uint8)
+
+    missing = [name for name in reference_names if name not in reference_rows]
+    if missing:
+        raise ValueError(f"Reference sequence '{missing[0]}' not found in the input file.")
+    if len({len(row) for row in reference_rows.values()}) != 1:
+        raise ValueError("Reference sequences are not all the same length - is this an alignment?")
+    return [reference_rows[name] for name in reference_names]
+
+
+def build_keep_mask(reference_rows, mode="union"):
+    """Boolean mask of alignment columns to keep, combining the references with union or intersection semantics."""
+    has_base = np.vstack(reference_rows) != GAP
+    return has_base.any(axis=0) if mode == "union" else has_base.all(axis=0)
+
+
+def format_fasta_sequence(seq_bytes):
+    """Wrap a sequence (uint8 array) at LINE_WIDTH characters without a Python loop over lines."""
+    n_lines = -(-len(seq_bytes) // LINE_WIDTH)
+    padded = np.zeros((n_lines, LINE_WIDTH + 1), dtype=np.uint8)
+    padded[:, :LINE_WIDTH].flat[:len(seq_bytes)] = seq_bytes
+    padded[:, LINE_WIDTH] = ord("\n")
+    # Drop the padding after the final base; only the last line can be short
+    wrapped = padded.tobytes()
+    last_line_length = len(seq_bytes) - (n_lines - 1) * LINE_WIDTH
+    return wrapped[:(n_lines - 1) * (LINE_WIDTH + 1) + last_line_length] + b"\n"
+
+
+def write_coordinate_map(coords_file, reference_names, reference_rows, keep_index, chunk_size=COORDS_CHUNK):
+    """
+    Write one row per kept column: its new column, original column and position in each reference (NA at a gap).
+    The alignment is walked in blocks of chunk_size columns, and each block's rows are built as integers (-1 at a gap) and written straight away.
+    """
+    line_format = "\t".join(["%d"] * (2 + len(reference_rows))) + "\n"
+    bases_before = [0] * len(reference_rows)  # Bases of each reference before the current block
+    n_columns = len(reference_rows[0])
+    with open(coords_file, "w") as out:
+        out.write("\t".join(["new_column", "alignment_column"] + list(reference_names)) + "\n")
+        for block_start in range(0, n_columns, chunk_size):
+            block_end = min(block_start + chunk_size, n_columns)
+            first, last = np.searchsorted(keep_index, [block_start, block_end])
+            kept = keep_index[first:last]
+            offsets = kept - block_start
+            table = np.empty((len(kept), 2 + len(reference_rows)), dtype=np.int64)
+            table[:, 0] = np.arange(first + 1, last + 1)
+            table[:, 1] = kept + 1
+            for i, row in enumerate(reference_rows):
+                has_base = row[block_start:block_end] != GAP
+                positions = np.cumsum(has_base, dtype=np.int64) + bases_before[i]
+                table[:, 2 + i] = np.where(has_base[offsets], positions[offsets], -1)
+                bases_before[i] = int(positions[-1])
+            # -1 is the only negative value, so it can be swapped for NA in the formatted text
+            out.write((line_format * len(kept) % tuple(table.ravel().tolist())).replace("-1", "NA"))
+
+
+def remove_gaps_by_reference(input_file, reference_name, output_file, mode="union", coords_file=None):
+    reference_names = [reference_name] if isinstance(reference_name, str) else list(reference_name)
+    reference_rows = read_reference_rows(input_file, reference_names)
+    keep_index = np.flatnonzero(build_keep_mask(reference_rows, mode))
+    print(f"Keeping {len(keep_index)} of {len(reference_rows[0])} alignment columns.")
+
+    # Second pass: stream every record through the same column selection
+    with open(input_file, "r") as handle, open(output_file, "wb") as out:
+        for title, seq in SimpleFastaParser(handle):
+            row = np.frombuffer(seq.encode(), dtype=np.uint8)
+            if len(row) != len(reference_rows[0]):
+                raise ValueError(f"Sequence '{title}' is not the same length as the reference - is this an alignment?")
+            out.write(f">{title}\n".encode())
+            out.write(format_fasta_sequence(row.take(keep_index)))
+
+    if coords_file:
+        write_coordinate_map(coords_file, reference_names, reference_rows, keep_index)
+        print(f"Column-to-reference coordinate map saved to {coords_file}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove alignment columns where the reference species has a gap.")
+    parser.add_argument("--input_file", required=True, help="Path to the input FASTA alignment.")
+    parser.add_argument("--reference", required=True, nargs="+", help="Reference sequence name(s), e.g. Bos_taurus.")
+    parser.add_argument("--output_file", required=True, help="Path to the gap-stripped FASTA alignment.")
+    parser.add_argument("--mode", choices=["union", "intersection"], default="union", help="With several references, keep a column if any (union) or every (intersection) reference has a base there (default: union).")
+    parser.add_argument("--coords_file", help="Optional TSV mapping kept columns to the original alignment column and reference positions.")
+
+    args = parser.parse_args()
+    remove_gaps_by_reference(args.input_file, args.reference, args.output_file, args.mode, args.coords_file)
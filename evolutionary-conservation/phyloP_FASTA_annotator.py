@@ -2,19 +2,35 @@
 Script title: phyloP_FASTA_annotator.v2.py
 Author: Emmarie Alexander
 Date written: 08-January-2025
-Date last updated: 29-Jul-2025
-Version: 2.0
+Date last updated: 18-Oct-2026
+Version: 2.1
 Purpose: This CLI python-based script allows users to annotate their FASTA file with phyloP scores and then filter sites based on a user provided threshold to create a new FASTA file.
 Notes: I have provided the environment file to run this script - the YML is called phyloP_env.yml.
 If you want to generate a .svg file of your plot, you need to add the '.svg' extension at the end of your argument... e.g., "--plot HRA_phyloP_distributions.svg"
 The PhyloP program will output a .txt file that contains phyloP scores per site. Use this as your "phyloP" file.
+The "phyloP" file can also be phyloP's fixedStep/variableStep WIG output or a bedGraph. These are placed by reference coordinate (the first alignment column is '--ref_start', default 1) and sites without a score are left as NaN, which never pass the filter. Use '--chrom' if the file covers more than one chromosome.
+Extra score classes (e.g. strongly conserved sites) can be counted and shaded with '--score_class LABEL MIN MAX'; all classes and the histogram are counted in a single pass over the scores.
+To sweep several filtering thresholds from one parse, give '--cutoffs' either a TSV of min/max pairs or a list such as --cutoffs="-0.25,0.25;-0.5,0.5;-1.0,1.0". Each band gets its own filtered FASTA in a subdirectory of the output directory, and the site counts are written to cutoff_summary.tsv.
+'--columnar npz' (compressed) or '--columnar npy' (memory-mappable, also works with --stream) saves the species x sites byte matrix, float32 phyloP scores and filter mask(s) as NumPy arrays; add '--no_csv' to skip the per-site CSV dumps.
+'--window_size' and '--step_size' (same values as the sliding-window analysis) add a per-window summary of the scores (scored sites, mean phyloP, fraction of each score class) as a TSV or bedGraph. Windows are numbered from 1 and window n starts at alignment column (n - 1) * step_size + 1; only complete windows are reported.
+Summary v2.1: The alignment is now held as a species x sites uint8 NumPy matrix (one byte per base) instead of a list of per-column Python lists, so genome-scale alignments fit in memory. Filtering is a boolean column mask.
+Add '--stream' to filter chromosome-scale alignments in fixed-size column blocks (set with '--block_size') without loading the whole alignment or score file; the plot is skipped in this mode.
 """
 import argparse
 import os
 import csv
+import contextlib
+import shutil
+import tempfile
 import logging
+import re
+import warnings
+import numpy as np
 import matplotlib.pyplot as plt
 
+# Shading colours for the score classes on the plot, in the order the classes are given
+CLASS_COLORS = ['green', 'blue', 'red', 'purple', 'orange', 'brown', 'olive', 'cyan']
+
 # Set-up the log file
 def setup_logger(log_file):
     """Set up the logger to write to both a log file and the console."""
@@ -40,56 +56,234 @@ def ensure_output_dir_exists(output_dir):
 
 
 def parse_fasta(fasta_file):
-    """Parse input FASTA file and convert it to a tabular format."""
+    """Parse input FASTA file into a species x sites uint8 matrix (one byte per base)."""
     logging.info(f"Parsing FASTA file: {fasta_file}")
     try:
-        with open(fasta_file, 'r') as f:
-            species_names = []
-            sequences = []
-            # Read the FASTA line by line
-            current_sequence = []
+        species_names = []
+        sequence_lengths = []
+        # All sequences are appended to one flat byte buffer so the matrix can be built without a copy
+        buffer = bytearray()
+        with open(fasta_file, 'rb') as f:
             for line in f:
                 line = line.strip()
-                if line.startswith(">"):
-                    species_names.append(line[1:])  # Get species name
-                    if current_sequence:
-                        sequences.append("".join(current_sequence))
-                        current_sequence = []
+                if not line:
+                    continue
+                if line.startswith(b">"):
+                    species_names.append(line[1:].decode())  # Get species name
+                    sequence_lengths.append(0)
                 else:
-                    current_sequence.append(line)
-            if current_sequence:
-                sequences.append("".join(current_sequence))
-        # Transpose sequences to create a base-by-base table
-        alignment_matrix = [list(seq) for seq in zip(*sequences)]
-        logging.info(f"Successfully parsed FASTA file: {len(species_names)} species, {len(alignment_matrix)} alignment positions.")
+                    buffer += line
+                    sequence_lengths[-1] += len(line)
+
+        if not species_names:
+            raise ValueError("No sequences were found in the FASTA file!")
+        if len(set(sequence_lengths)) != 1:
+            raise ValueError("Sequences in the FASTA file are not all the same length - is this an alignment?")
+
+        # Reshape the flat buffer into a species x sites matrix
+        alignment_matrix = np.frombuffer(buffer, dtype=np.uint8).reshape(len(species_names), sequence_lengths[0])
+        logging.info(f"Successfully parsed FASTA file: {len(species_names)} species, {alignment_matrix.shape[1]} alignment positions.")
         return species_names, alignment_matrix
     except Exception as e:
         logging.error(f"Error parsing FASTA file: {e}")
         raise
 
 
-def read_phyloP_scores(phyloP_file):
-    """Read the phyloP scores from text file."""
+def parse_numbers(text):
+    """Bulk-convert whitespace-separated numbers into a float64 array."""
+    with warnings.catch_warnings():
+        # NumPy only warns (rather than raises) when it hits something that is not a number
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            return np.fromstring(text, dtype=np.float64, sep=" ")
+        except (DeprecationWarning, ValueError):
+            raise ValueError("phyloP file contains a value that could not be read as a number.")
+
+
+def detect_phyloP_format(phyloP_file):
+    """Guess whether the phyloP file is a bare column of scores, a WIG or a bedGraph from its first data line."""
+    with open(phyloP_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith(("track", "browser", "#")):
+                continue
+            if line.startswith(("fixedStep", "variableStep")):
+                return "wig"
+            if len(line.split()) == 4:
+                return "bedgraph"
+            return "scores"
+    return "scores"
+
+
+def fill_score_array(starts, spans, values, ref_start, length):
+    """Place scores by 1-based reference position into a float32 array, leaving unscored sites as NaN."""
+    index = starts.astype(np.int64) - ref_start
+    spans = spans.astype(np.int64)
+    if (spans != 1).any():
+        # Expand each interval into one entry per site it covers
+        values = np.repeat(values, spans)
+        offsets = np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans)
+        index = np.repeat(index, spans) + offsets
+    if length is None:
+        length = int(index.max()) + 1 if len(index) else 0
+
+    in_range = (index >= 0) & (index < length)
+    if not in_range.all():
+        logging.warning(f"{int((~in_range).sum())} phyloP scores fall outside the alignment and were ignored.")
+    scores = np.full(length, np.nan, dtype=np.float32)
+    scores[index[in_range]] = values[in_range]
+    return scores
+
+
+def select_chrom(chroms, chrom):
+    """Pick which chromosome's scores to use, refusing to guess when the file has several."""
+    if chrom is None:
+        if len(set(chroms)) > 1:
+            raise ValueError(f"phyloP file covers several chromosomes ({', '.join(sorted(set(chroms)))}); choose one with --chrom.")
+        return chroms[0] if chroms else None
+    if chrom not in chroms:
+        raise ValueError(f"Chromosome '{chrom}' was not found in the phyloP file.")
+    return chrom
+
+
+def read_wig(data, chrom, ref_start, length):
+    """Read fixedStep/variableStep WIG sections into a score array indexed by reference position."""
+    headers = list(re.finditer(rb"^(fixedStep|variableStep)([^\n]*)$", data, re.M))
+    sections = []
+    for i, header in enumerate(headers):
+        params = dict(token.split(b"=", 1) for token in header.group(2).split())
+        body_end = headers[i + 1].start() if i + 1 < len(headers) else len(data)
+        sections.append((header.group(1), params, data[header.end():body_end]))
+
+    chrom = select_chrom([params[b"chrom"].decode() for _, params, _ in sections], chrom)
+    starts, spans, values = [], [], []
+    for step_type, params, body in sections:
+        if params[b"chrom"].decode() != chrom:
+            continue
+        span = int(params.get(b"span", 1))
+        numbers = parse_numbers(body)
+        if step_type == b"fixedStep":
+            step = int(params.get(b"step", 1))
+            section_starts = int(params[b"start"]) + step * np.arange(len(numbers))
+            section_values = numbers
+        else:
+            pairs = numbers.reshape(-1, 2)
+            section_starts, section_values = pairs[:, 0], pairs[:, 1]
+        starts.append(section_starts)
+        spans.append(np.full(len(section_values), span))
+        values.append(section_values)
+
+    if not values:
+        return np.full(length or 0, np.nan, dtype=np.float32)
+    return fill_score_array(np.concatenate(starts), np.concatenate(spans), np.concatenate(values), ref_start, length)
+
+
+def read_bedgraph(data, chrom, ref_start, length):
+    """Read a bedGraph (0-based, half-open intervals) into a score array indexed by reference position."""
+    # Drop track/browser/comment lines so the chromosome column is the only text left
+    data = re.sub(rb"(?m)^(track|browser|#).*\n?", b"", data)
+    # Fields may be separated by tabs or spaces
+    chroms = [c.decode() for c in dict.fromkeys(re.findall(rb"(?m)^(\S+)[ \t]", data))]
+    if not chroms:
+        raise ValueError("No bedGraph data lines (chrom start end score) were found in the phyloP file.")
+    chrom = select_chrom(chroms, chrom)
+    if len(chroms) > 1:
+        # Keep only the lines for the chosen chromosome
+        data = re.sub(rb"(?m)^(?!" + re.escape(chrom.encode()) + rb"[ \t]).*\n?", b"", data)
+    data = re.sub(rb"(?m)^" + re.escape(chrom.encode()) + rb"[ \t]", b"", data)
+
+    intervals = parse_numbers(data).reshape(-1, 3)
+    if not len(intervals):
+        raise ValueError(f"No bedGraph scores were found for chromosome '{chrom}'.")
+    return fill_score_array(intervals[:, 0] + 1, intervals[:, 1] - intervals[:, 0], intervals[:, 2], ref_start, length)
+
+
+def read_phyloP_scores(phyloP_file, score_format="auto", chrom=None, ref_start=1, length=None):
+    """Read the phyloP scores (bare column, WIG or bedGraph) into a float32 array."""
     logging.info(f"Reading phyloP scores file: {phyloP_file}")
     try:
-        with open(phyloP_file, 'r') as f:
-            scores = [float(line.strip()) for line in f if line.strip()]  # Skip empty lines
-        logging.info(f"Total phyloP scores: {len(scores)}")
-        logging.info(f"Min phyloP score: {min(scores)}, Max phyloP score: {max(scores)}")
+        if score_format == "auto":
+            score_format = detect_phyloP_format(phyloP_file)
+            logging.info(f"Detected phyloP file format: {score_format}")
+        with open(phyloP_file, 'rb') as f:
+            data = f.read()
+
+        if score_format == "wig":
+            scores = read_wig(data, chrom, ref_start, length)
+        elif score_format == "bedgraph":
+            scores = read_bedgraph(data, chrom, ref_start, length)
+        else:
+            # One score per alignment column, in order
+            scores = parse_numbers(data).astype(np.float32)
+        del data
+
+        scored = ~np.isnan(scores)
+        logging.info(f"Total phyloP scores: {len(scores)} ({int(len(scores) - scored.sum())} sites without a score)")
+        if scored.any():
+            logging.info(f"Min phyloP score: {scores[scored].min()!s}, Max phyloP score: {scores[scored].max()!s}")
         return scores
     except Exception as e:
         logging.error(f"Error reading phyloP scores file: {e}")
         raise
-        
 
-def count_scores_in_range(scores, score_range):
-    """Count the number of scores within a given range."""
-    count = sum(score_range[0] <= score <= score_range[1] for score in scores)
-    logging.info(f"Range {score_range}: Counted {count} scores")
-    return count
-    
 
-def write_summary_file(output_dir, conserved_count, conserved_range, neutral_count, neutral_range, accelerated_count, accelerated_range):
+def score_classes_from_args(args):
+    """Collect the conserved, neutral and accelerated ranges plus any extra --score_class ranges as (label, min, max)."""
+    score_classes = [
+        ("Conserved", args.conserved_min, args.conserved_max),
+        ("Neutral", args.neutral_min, args.neutral_max),
+        ("Accelerated", args.accelerated_min, args.accelerated_max),
+    ]
+    for label, class_min, class_max in args.score_class or []:
+        score_classes.append((label, float(class_min), float(class_max)))
+    return score_classes
+
+
+def bin_scores(scores, score_classes, bins=None):
+    """
+    Count scores in every class range (inclusive) and, optionally, in histogram bins with one vectorized pass.
+
+    Every class bound and bin edge is merged into one sorted boundary array. Each score is placed in a cell
+    (either exactly on a boundary, or between two boundaries) and the cells are counted once with bincount,
+    so any class or bin count is just a difference of the cumulative cell counts.
+    Returns the per-class counts and, if bins is given, the histogram counts and edges (NaN scores are ignored).
+    """
+    scores = scores[~np.isnan(scores)]
+    boundaries = [bound for _, class_min, class_max in score_classes for bound in (class_min, class_max)]
+    edges = None
+    if bins:
+        low, high = (float(scores.min()), float(scores.max())) if len(scores) else (0.0, 1.0)
+        if low == high:
+            low, high = low - 0.5, high + 0.5
+        edges = np.linspace(low, high, bins + 1).astype(scores.dtype)
+        boundaries.extend(edges.tolist())
+    boundaries = np.unique(np.asarray(boundaries, dtype=scores.dtype))
+
+    # Cell 2i+1 holds scores equal to boundaries[i]; cell 2i holds scores between boundaries[i-1] and boundaries[i]
+    cells = np.searchsorted(boundaries, scores, side='left') + np.searchsorted(boundaries, scores, side='right')
+    cumulative = np.concatenate(([0], np.cumsum(np.bincount(cells, minlength=2 * len(boundaries) + 1))))
+
+    def count_cells(first_cell, last_cell):
+        return int(cumulative[last_cell + 1] - cumulative[first_cell]) if last_cell >= first_cell else 0
+
+    class_counts = []
+    for label, class_min, class_max in score_classes:
+        first = np.searchsorted(boundaries, np.asarray(class_min, dtype=scores.dtype))
+        last = np.searchsorted(boundaries, np.asarray(class_max, dtype=scores.dtype))
+        count = count_cells(2 * first + 1, 2 * last + 1)
+        logging.info(f"{label} range ({class_min}, {class_max}): Counted {count} scores")
+        class_counts.append(count)
+
+    if edges is None:
+        return class_counts, None, None
+    # Histogram bins are half-open [edge, next edge), except the last which also includes its right edge
+    edge_index = np.searchsorted(boundaries, edges)
+    hist_counts = cumulative[2 * edge_index[1:] + 1] - cumulative[2 * edge_index[:-1] + 1]
+    hist_counts[-1] += count_cells(2 * edge_index[-1] + 1, 2 * edge_index[-1] + 1)
+    return class_counts, hist_counts, edges
+
+
+def write_summary_file(output_dir, score_classes, class_counts):
     """Write a summary file with the counts of scores in each range."""
     summary_file = os.path.join(output_dir, "score_summary.txt")
     logging.info(f"Writing summary file: {summary_file}")
@@ -97,20 +291,34 @@ def write_summary_file(output_dir, conserved_count, conserved_range, neutral_cou
         with open(summary_file, 'w') as f:
             f.write("PhyloP Score Summary\n")
             f.write("====================\n")
-            f.write(f"Conserved range: {conserved_range[0]} to {conserved_range[1]}\n")
-            f.write(f"Conserved count: {conserved_count}\n\n")
-            f.write(f"Neutral range: {neutral_range[0]} to {neutral_range[1]}\n")
-            f.write(f"Neutral count: {neutral_count}\n\n")
-            f.write(f"Accelerated range: {accelerated_range[0]} to {accelerated_range[1]}\n")
-            f.write(f"Accelerated count: {accelerated_count}\n")
+            f.write("\n".join(
+                f"{label} range: {class_min} to {class_max}\n{label} count: {count}\n"
+                for (label, class_min, class_max), count in zip(score_classes, class_counts)
+            ))
         logging.info(f"Summary file written successfully: {summary_file}")
     except Exception as e:
         logging.error(f"Error writing summary file: {e}")
         raise
 
 
+def write_csv_rows(f, alignment_matrix, phyloP_scores, chunk_size=100000):
+    """Write one CSV row per alignment column (bases followed by the phyloP score) to an open file."""
+    n_species = alignment_matrix.shape[0]
+    width = 2 * n_species
+    # Interleave bases with commas as bytes a block of columns at a time, then append the score
+    for start in range(0, alignment_matrix.shape[1], chunk_size):
+        block = alignment_matrix[:, start:start + chunk_size].T
+        row_bytes = np.full((block.shape[0], width), ord(','), dtype=np.uint8)
+        row_bytes[:, 0::2] = block
+        prefixes = row_bytes.tobytes().decode()
+        scores = phyloP_scores[start:start + chunk_size].astype(str).tolist()
+        f.write("".join(
+            f"{prefixes[i * width:(i + 1) * width]}{score}\r\n" for i, score in enumerate(scores)
+        ))
+
+
 def write_csv(file_path, species_names, alignment_matrix, phyloP_scores):
-    """Write alignment and phyloP scores to a CSV file."""
+    """Write alignment and phyloP scores to a CSV file (one row per alignment column)."""
     logging.info(f"Writing CSV file: {file_path}")
     try:
         with open(file_path, 'w', newline='') as f:
@@ -118,42 +326,213 @@ def write_csv(file_path, species_names, alignment_matrix, phyloP_scores):
             # Write header
             writer.writerow(species_names + ["phyloP"])
             # Write rows
-            for row, score in zip(alignment_matrix, phyloP_scores):
-                writer.writerow(row + [score])
+            write_csv_rows(f, alignment_matrix, phyloP_scores)
         logging.info(f"Successfully wrote CSV file: {file_path}")
     except Exception as e:
         logging.error(f"Error writing CSV file: {e}")
         raise
 
 def write_fasta(file_path, species_names, alignment_matrix):
-    """Convert the CSV file back into FASTA format."""
+    """Write each row of the alignment matrix back out in FASTA format."""
     logging.info(f"Writing FASTA file: {file_path}")
     try:
-        with open(file_path, 'w') as f:
-            for i, species in enumerate(species_names):
-                f.write(f">{species}\n")
-                f.write("".join(row[i] for row in alignment_matrix) + "\n")
+        with open(file_path, 'wb') as f:
+            for species, row in zip(species_names, alignment_matrix):
+                f.write(f">{species}\n".encode())
+                f.write(row.tobytes() + b"\n")
         logging.info(f"Successfully wrote FASTA file: {file_path}")
     except Exception as e:
-      logging
+        logging.error(f"Error writing FASTA file: {e}")
+        raise
+
+
+def positive_int(value):
+    """argparse type for window and step sizes, which must be at least 1."""
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
+
+def window_summary(phyloP_scores, score_classes, window_size, step_size):
+    """
+    Summarise the phyloP scores in every sliding window using cumulative sums, so each window costs O(1).
+
+    Returns the 0-based window start columns, scored-site counts, mean phyloP (NaN when nothing is scored)
+    and the fraction of scored sites in each score class.
+    """
+    if window_size <= 0 or step_size <= 0:
+        raise ValueError(f"Window and step sizes must be positive (got {window_size} and {step_size}).")
+    starts = np.arange(0, len(phyloP_scores) - window_size + 1, step_size)
+    ends = starts + window_size
+    scored = ~np.isnan(phyloP_scores)
+
+    def window_totals(values, dtype):
+        cumulative = np.zeros(len(values) + 1, dtype=dtype)
+        np.cumsum(values, dtype=dtype, out=cumulative[1:])
+        return cumulative[ends] - cumulative[starts]
+
+    scored_sites = window_totals(scored, np.int64)
+    score_sums = window_totals(np.where(scored, phyloP_scores, 0), np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_scores = score_sums / scored_sites
+        class_fractions = [
+            window_totals((phyloP_scores >= class_min) & (phyloP_scores <= class_max), np.int64) / scored_sites
+            for _, class_min, class_max in score_classes
+        ]
+    return starts, scored_sites, mean_scores, class_fractions
+
+
+def write_window_summary(output_dir, phyloP_scores, score_classes, args):
+    """Write the per-window phyloP summary as a TSV keyed by window number, or as a bedGraph of mean phyloP."""
+    logging.info(f"Summarising phyloP scores in windows of {args.window_size} (step {args.step_size}).")
+    starts, scored_sites, mean_scores, class_fractions = window_summary(phyloP_scores, score_classes, args.window_size, args.step_size)
+    try:
+        if args.window_format == "bedgraph":
+            window_file = os.path.join(output_dir, "phyloP_windows.bedGraph")
+            # bedGraph intervals may not overlap, so each window is drawn over its central step-wide slice
+            offset = (args.window_size - args.step_size) // 2 if args.step_size < args.window_size else 0
+            width = min(args.step_size, args.window_size)
+            bed_starts = starts + offset + args.ref_start - 1
+            chrom = args.chrom or "alignment"
+            with open(window_file, 'w') as f:
+                f.write(f'track type=bedGraph name="phyloP_windows" description="Mean phyloP per {args.window_size} bp window"\n')
+                f.writelines(
+                    f"{chrom}\t{start}\t{start + width}\t{mean:.4f}\n"
+                    for start, mean in zip(bed_starts.tolist(), mean_scores.tolist()) if mean == mean  # Skip windows with no scores
+                )
+        else:
+            window_file = os.path.join(output_dir, "phyloP_windows.tsv")
+            header = ["window", "start", "end", "scored_sites", "mean_phyloP"] + [f"fraction_{label.lower()}" for label, _, _ in score_classes]
+            columns = [np.arange(1, len(starts) + 1), starts + 1, starts + args.window_size, scored_sites, mean_scores] + class_fractions
+            np.savetxt(window_file, np.column_stack(columns), delimiter="\t", header="\t".join(header), comments="",
+                       fmt=["%d", "%d", "%d", "%d"] + ["%.4f"] * (len(columns) - 4))
+        logging.info(f"Wrote {len(starts)} window summaries to {window_file}")
+    except Exception as e:
+        logging.error(f"Error writing window summary: {e}")
+        raise
+
+
+def write_columnar(output_dir, columnar_format, species_names, alignment_matrix, phyloP_scores, masks, cutoffs):
+    """
+    Save the alignment, phyloP scores and filter mask(s) as NumPy arrays instead of text.
+
+    'npz' writes one compressed alignment_columnar.npz. 'npy' writes an alignment_columnar/ directory of .npy files
+    that can be opened with np.load(path, mmap_mode='r'). masks holds one row per (min, max) band in cutoffs.
+    """
+    arrays = {
+        "species": np.array(species_names),
+        "alignment": alignment_matrix,
+        "phyloP": phyloP_scores.astype(np.float32, copy=False),
+        "filter_mask": masks,
+        "cutoffs": np.asarray(cutoffs, dtype=np.float64),
+    }
+    try:
+        if columnar_format == "npz":
+            columnar_path = os.path.join(output_dir, "alignment_columnar.npz")
+            logging.info(f"Writing columnar file: {columnar_path}")
+            np.savez_compressed(columnar_path, **arrays)
+        else:
+            columnar_path = os.path.join(output_dir, "alignment_columnar")
+            logging.info(f"Writing columnar directory: {columnar_path}")
+            ensure_output_dir_exists(columnar_path)
+            for name, array in arrays.items():
+                np.save(os.path.join(columnar_path, f"{name}.npy"), array)
+        logging.info(f"Successfully wrote columnar output: {columnar_path}")
+    except Exception as e:
+        logging.error(f"Error writing columnar output: {e}")
+        raise
 
 
-def plot_phyloP_distribution(phyloP_scores, conserved_range, neutral_range, accelerated_range, output_path=None):
-    """Plot the distribution of phyloP scores with defined ranges and labels."""
+def open_columnar_memmaps(output_dir, species_names, alignment_length, cutoffs):
+    """Create the .npy files of the 'npy' columnar layout on disk so --stream can fill them one block at a time."""
+    columnar_path = os.path.join(output_dir, "alignment_columnar")
+    logging.info(f"Writing columnar directory: {columnar_path}")
+    ensure_output_dir_exists(columnar_path)
+    np.save(os.path.join(columnar_path, "species.npy"), np.array(species_names))
+    np.save(os.path.join(columnar_path, "cutoffs.npy"), np.asarray(cutoffs, dtype=np.float64))
+    shapes = {
+        "alignment": (np.uint8, (len(species_names), alignment_length)),
+        "phyloP": (np.float32, (alignment_length,)),
+        "filter_mask": (np.bool_, (len(cutoffs), alignment_length)),
+    }
+    return {
+        name: np.lib.format.open_memmap(os.path.join(columnar_path, f"{name}.npy"), mode='w+', dtype=dtype, shape=shape)
+        for name, (dtype, shape) in shapes.items()
+    }
+
+
+def is_number(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+def parse_cutoffs(cutoffs):
+    """Read (min, max) cutoff bands from a TSV file or a 'min,max;min,max' string."""
+    if os.path.isfile(cutoffs):
+        with open(cutoffs, 'r') as f:
+            rows = [line.split() for line in f if line.strip() and not line.startswith("#")]
+        # Allow a header row such as "min_cutoff  max_cutoff" (any first row that isn't numeric)
+        if rows and not is_number(rows[0][0]):
+            rows = rows[1:]
+    else:
+        rows = [band.split(",") for band in cutoffs.split(";") if band.strip()]
+    bands = [(float(row[0]), float(row[1])) for row in rows]
+    if not bands:
+        raise ValueError(f"No cutoff bands could be read from '{cutoffs}'.")
+    for band_min, band_max in bands:
+        if band_min > band_max:
+            raise ValueError(f"Cutoff band ({band_min}, {band_max}) has its minimum above its maximum.")
+    return bands
+
+
+def cutoff_dir(output_dir, band):
+    """Subdirectory holding the filtered outputs for one cutoff band."""
+    return os.path.join(output_dir, f"phyloP_{band[0]}_to_{band[1]}")
+
+
+def filter_masks(phyloP_scores, cutoffs):
+    """Build one boolean column mask per (min, max) band with a single broadcast comparison."""
+    bands = np.asarray(cutoffs, dtype=phyloP_scores.dtype)
+    return (phyloP_scores >= bands[:, :1]) & (phyloP_scores <= bands[:, 1:])
+
+
+def write_cutoff_summary(output_dir, cutoffs, kept_counts, alignment_length):
+    """Write the number of sites kept by each cutoff band to a TSV."""
+    summary_file = os.path.join(output_dir, "cutoff_summary.tsv")
+    logging.info(f"Writing cutoff summary file: {summary_file}")
+    with open(summary_file, 'w') as f:
+        f.write("min_cutoff\tmax_cutoff\tsites_kept\ttotal_sites\toutput_dir\n")
+        for band, kept in zip(cutoffs, kept_counts):
+            f.write(f"{band[0]}\t{band[1]}\t{kept}\t{alignment_length}\t{cutoff_dir(output_dir, band)}\n")
+            logging.info(f"Cutoff band {band}: {kept} of {alignment_length} sites kept.")
+
+
+def write_cutoff_sweep(output_dir, species_names, alignment_matrix, phyloP_scores, cutoffs):
+    """Filter the alignment against every cutoff band at once, write one FASTA per band and return the masks."""
+    masks = filter_masks(phyloP_scores, cutoffs)
+    for band, mask in zip(cutoffs, masks):
+        band_dir = cutoff_dir(output_dir, band)
+        ensure_output_dir_exists(band_dir)
+        write_fasta(os.path.join(band_dir, "alignment_filtered.fasta"), species_names, alignment_matrix[:, mask])
+    write_cutoff_summary(output_dir, cutoffs, masks.sum(axis=1).tolist(), alignment_matrix.shape[1])
+    return masks
+
+
+def plot_phyloP_distribution(score_classes, class_counts, hist_counts, edges, output_path=None):
+    """Plot the pre-binned distribution of phyloP scores with the class ranges shaded and labelled."""
     logging.info("Plotting phyloP score distribution.")
     try:
         plt.figure(figsize=(10, 6))
-        plt.hist(phyloP_scores, bins=50, color='skyblue', edgecolor='black', alpha=0.7)
-
-        # Highlight the ranges and count scores
-        conserved_count = count_scores_in_range(phyloP_scores, conserved_range)
-        neutral_count = count_scores_in_range(phyloP_scores, neutral_range)
-        accelerated_count = count_scores_in_range(phyloP_scores, accelerated_range)
+        # The counts are already binned, so each bin is drawn once with its count as the weight
+        plt.hist(edges[:-1], bins=edges, weights=hist_counts, color='skyblue', edgecolor='black', alpha=0.7)
 
         # Add shaded regions and labels
-        plt.axvspan(conserved_range[0], conserved_range[1], color='green', alpha=0.2, label=f"Conserved ({conserved_count})")
-        plt.axvspan(neutral_range[0], neutral_range[1], color='blue', alpha=0.2, label=f"Neutral ({neutral_count})")
-        plt.axvspan(accelerated_range[0], accelerated_range[1], color='red', alpha=0.2, label=f"Accelerated ({accelerated_count})")
+        for i, ((label, class_min, class_max), count) in enumerate(zip(score_classes, class_counts)):
+            plt.axvspan(class_min, class_max, color=CLASS_COLORS[i % len(CLASS_COLORS)], alpha=0.2, label=f"{label} ({count})")
 
         # Add labels and legend
         plt.title("PhyloP Score Distribution with Ranges")
@@ -162,17 +541,186 @@ def plot_phyloP_distribution(phyloP_scores, conserved_range, neutral_range, acce
         plt.legend()
 
         if output_path:
-            plt.savefig(output_path, format=".svg")
+            plt.savefig(output_path)  # The format is taken from the file extension, e.g. ".svg"
             logging.info(f"Saved phyloP distribution plot to {output_path}")
         else:
             plt.show()
-
-        return conserved_count, neutral_count, accelerated_count
     except Exception as e:
         logging.error(f"Error plotting phyloP distribution: {e}")
         raise
 
 
+def index_fasta(fasta_file):
+    """Record where each sequence starts in the FASTA file and how its lines are wrapped, without keeping the sequences."""
+    logging.info(f"Indexing FASTA file: {fasta_file}")
+    species_names = []
+    fasta_index = []  # [sequence byte offset, bases per line, bytes per line, sequence length]
+    with open(fasta_file, 'rb') as f:
+        offset = 0
+        last_line_seen = False
+        for line in f:
+            stripped = line.rstrip(b"\r\n")
+            if line.startswith(b">"):
+                species_names.append(stripped[1:].strip().decode())
+                fasta_index.append([offset + len(line), 0, 0, 0])
+                last_line_seen = False
+            elif stripped:
+                entry = fasta_index[-1]
+                if entry[1] == 0:
+                    entry[1], entry[2] = len(stripped), len(line)
+                elif last_line_seen or len(stripped) > entry[1]:
+                    raise ValueError(f"Sequence '{species_names[-1]}' has lines of differing length; --stream needs a consistently wrapped FASTA.")
+                elif len(stripped) < entry[1]:
+                    last_line_seen = True  # Only the final line of a sequence may be shorter
+                entry[3] += len(stripped)
+            offset += len(line)
+
+    if not species_names:
+        raise ValueError("No sequences were found in the FASTA file!")
+    if len({entry[3] for entry in fasta_index}) != 1:
+        raise ValueError("Sequences in the FASTA file are not all the same length - is this an alignment?")
+    logging.info(f"Indexed FASTA file: {len(species_names)} species, {fasta_index[0][3]} alignment positions.")
+    return species_names, fasta_index
+
+
+def read_alignment_block(f, fasta_index, start, end):
+    """Read alignment columns [start, end) for every species into a species x sites uint8 matrix."""
+    block = np.empty((len(fasta_index), end - start), dtype=np.uint8)
+    for i, (offset, line_bases, line_bytes, _) in enumerate(fasta_index):
+        # Translate column positions into byte positions, accounting for line wrapping
+        first_byte = offset + (start // line_bases) * line_bytes + start % line_bases
+        last_byte = offset + (end // line_bases) * line_bytes + end % line_bases
+        f.seek(first_byte)
+        raw = f.read(last_byte - first_byte).replace(b"\n", b"").replace(b"\r", b"")
+        block[i] = np.frombuffer(raw, dtype=np.uint8)
+    return block
+
+
+def read_phyloP_block(score_lines, block_size):
+    """Read the next block_size phyloP scores from an open score file."""
+    scores = []
+    for line in score_lines:
+        line = line.strip()
+        if line:  # Skip empty lines
+            scores.append(float(line))
+            if len(scores) == block_size:
+                break
+    return np.array(scores, dtype=np.float32)
+
+
+def iter_phyloP_blocks(args, alignment_length):
+    """Yield the phyloP scores one block at a time, checking the score count against the alignment as it goes."""
+    score_format = args.phyloP_format
+    if score_format == "auto":
+        score_format = detect_phyloP_format(args.phyloP)
+    if score_format != "scores":
+        # WIG/bedGraph scores are placed by coordinate, so the array always matches the alignment length
+        scores = read_phyloP_scores(args.phyloP, score_format, args.chrom, args.ref_start, alignment_length)
+        for start in range(0, alignment_length, args.block_size):
+            yield scores[start:start + args.block_size]
+        return
+
+    with open(args.phyloP, 'r') as score_lines:
+        for start in range(0, alignment_length, args.block_size):
+            end = min(start + args.block_size, alignment_length)
+            phyloP_scores = read_phyloP_block(score_lines, end - start)
+            if len(phyloP_scores) != end - start:
+                raise ValueError(f"Number of phyloP scores does not match the number of alignment positions! Scores ran out at position {start + len(phyloP_scores)} of {alignment_length}.")
+            # Any scores left over mean the score file is longer than the alignment
+            if end == alignment_length and len(read_phyloP_block(score_lines, 1)):
+                raise ValueError("Number of phyloP scores does not match the number of alignment positions! The phyloP file has more scores than the alignment has columns.")
+            yield phyloP_scores
+
+
+def write_fasta_from_buffers(file_path, species_names, species_buffers):
+    """Stitch per-species temporary buffers of filtered bases into a FASTA file."""
+    logging.info(f"Writing FASTA file: {file_path}")
+    with open(file_path, 'wb') as f:
+        for species, buffer in zip(species_names, species_buffers):
+            f.write(f">{species}\n".encode())
+            buffer.seek(0)
+            shutil.copyfileobj(buffer, f)
+            f.write(b"\n")
+    logging.info(f"Successfully wrote FASTA file: {file_path}")
+
+
+def stream_filter(args):
+    """Filter the alignment against the phyloP cutoffs one block of columns at a time."""
+    species_names, fasta_index = index_fasta(args.fasta)
+    alignment_length = fasta_index[0][3]
+    score_classes = score_classes_from_args(args)
+    class_counts = np.zeros(len(score_classes), dtype=np.int64)
+    cutoffs = parse_cutoffs(args.cutoffs) if args.cutoffs else [(args.min_cutoff, args.max_cutoff)]
+    kept_counts = np.zeros(len(cutoffs), dtype=np.int64)
+    window_scores = [] if args.window_size else None  # Scores are small next to the alignment, so keep them for the window summary
+
+    pre_filter_csv = os.path.join(args.output_dir, "alignment_pre_filter.csv")
+    filtered_csv = os.path.join(args.output_dir, "alignment_filtered.csv")
+    if args.cutoffs:
+        for band in cutoffs:
+            ensure_output_dir_exists(cutoff_dir(args.output_dir, band))
+        filtered_fastas = [os.path.join(cutoff_dir(args.output_dir, band), "alignment_filtered.fasta") for band in cutoffs]
+    else:
+        filtered_fastas = [os.path.join(args.output_dir, "alignment_filtered.fasta")]
+    logging.info(f"Streaming alignment in blocks of {args.block_size} columns.")
+
+    with contextlib.ExitStack() as stack:
+        # Filtered bases are spooled into one temporary file per species (per cutoff band), then stitched into the final FASTA
+        band_buffers = [
+            [stack.enter_context(tempfile.TemporaryFile(dir=args.output_dir)) for _ in species_names]
+            for _ in cutoffs
+        ]
+        fasta = stack.enter_context(open(args.fasta, 'rb'))
+        pre_f = filt_f = None
+        if not args.no_csv:
+            pre_f = stack.enter_context(open(pre_filter_csv, 'w', newline=''))
+            csv.writer(pre_f).writerow(species_names + ["phyloP"])
+            # The filtered CSV is only written for a single cutoff band
+            if not args.cutoffs:
+                filt_f = stack.enter_context(open(filtered_csv, 'w', newline=''))
+                csv.writer(filt_f).writerow(species_names + ["phyloP"])
+        columnar = open_columnar_memmaps(args.output_dir, species_names, alignment_length, cutoffs) if args.columnar else None
+
+        score_blocks = iter_phyloP_blocks(args, alignment_length)
+        for start, phyloP_scores in zip(range(0, alignment_length, args.block_size), score_blocks):
+            end = start + len(phyloP_scores)
+            alignment_block = read_alignment_block(fasta, fasta_index, start, end)
+
+            class_counts += bin_scores(phyloP_scores, score_classes)[0]
+            if window_scores is not None:
+                window_scores.append(phyloP_scores)
+            if pre_f:
+                write_csv_rows(pre_f, alignment_block, phyloP_scores)
+
+            masks = filter_masks(phyloP_scores, cutoffs)
+            if columnar:
+                columnar["alignment"][:, start:end] = alignment_block
+                columnar["phyloP"][start:end] = phyloP_scores
+                columnar["filter_mask"][:, start:end] = masks
+            kept_counts += masks.sum(axis=1)
+            for mask, species_buffers in zip(masks, band_buffers):
+                filtered_block = alignment_block[:, mask]
+                for buffer, row in zip(species_buffers, filtered_block):
+                    buffer.write(row.tobytes())
+                if filt_f:
+                    write_csv_rows(filt_f, filtered_block, phyloP_scores[mask])
+
+        for filtered_fasta, species_buffers in zip(filtered_fastas, band_buffers):
+            write_fasta_from_buffers(filtered_fasta, species_names, species_buffers)
+        if columnar:
+            for array in columnar.values():
+                array.flush()
+            logging.info(f"Successfully wrote columnar output: {os.path.join(args.output_dir, 'alignment_columnar')}")
+
+    if args.cutoffs:
+        write_cutoff_summary(args.output_dir, cutoffs, kept_counts.tolist(), alignment_length)
+    else:
+        logging.info(f"{int(kept_counts[0])} of {alignment_length} sites passed the phyloP filter.")
+    write_summary_file(args.output_dir, score_classes, class_counts.tolist())
+    if window_scores is not None:
+        write_window_summary(args.output_dir, np.concatenate(window_scores or [np.empty(0, dtype=np.float32)]), score_classes, args)
+
+
 def main(args):
     # Ensure the output directory exists
     ensure_output_dir_exists(args.output_dir)
@@ -184,63 +732,69 @@ def main(args):
     logging.info("Starting script execution.")
 
     try:
+        # Stream mode never holds the whole alignment or score file in memory
+        if args.stream:
+            if args.columnar == "npz":
+                raise ValueError("Compressed .npz output needs the whole alignment in memory; use '--columnar npy' with --stream.")
+            if args.plot:
+                logging.warning("The phyloP distribution plot is not available in --stream mode and will be skipped.")
+            stream_filter(args)
+            logging.info("Script execution completed successfully.")
+            return
+
         # Parse the FASTA file
         species_names, alignment_matrix = parse_fasta(args.fasta)
 
         # Read the phyloP scores
-        phyloP_scores = read_phyloP_scores(args.phyloP)
+        phyloP_scores = read_phyloP_scores(args.phyloP, args.phyloP_format, args.chrom, args.ref_start, alignment_matrix.shape[1])
 
         # Ensure the number of scores matches the alignment columns
-        if len(alignment_matrix) != len(phyloP_scores):
+        if alignment_matrix.shape[1] != len(phyloP_scores):
             raise ValueError("Number of phyloP scores does not match the number of alignment positions!")
 
+        # Count every score class and histogram bin in one pass, shared by the summary and the plot
+        score_classes = score_classes_from_args(args)
+        class_counts, hist_counts, edges = bin_scores(phyloP_scores, score_classes, bins=args.bins if args.plot else None)
+        write_summary_file(args.output_dir, score_classes, class_counts)
+
         # Plot phyloP distribution with ranges
         if args.plot:
             plot_path = os.path.join(args.output_dir, args.plot)
+            plot_phyloP_distribution(score_classes, class_counts, hist_counts, edges, output_path=plot_path)
+
+        # Per-window conservation summary to sit alongside the sliding-window trees
+        if args.window_size:
+            write_window_summary(args.output_dir, phyloP_scores, score_classes, args)
+
+        # Write pre-filtering CSV
+        if not args.no_csv:
+            pre_filter_csv = os.path.join(args.output_dir, "alignment_pre_filter.csv")
+            write_csv(pre_filter_csv, species_names, alignment_matrix, phyloP_scores)
 
-            conserved_count, neutral_count, accelerated_count = plot_phyloP_distribution(
-                phyloP_scores,
-                conserved_range=(args.conserved_min, args.conserved_max),
-                neutral_range=(args.neutral_min, args.neutral_max),
-                accelerated_range=(args.accelerated_min, args.accelerated_max),
-                output_path=plot_path
-            )
+        if args.cutoffs:
+            # Sweep every cutoff band from this one parse instead of the single min/max cutoff
+            cutoffs = parse_cutoffs(args.cutoffs)
+            masks = write_cutoff_sweep(args.output_dir, species_names, alignment_matrix, phyloP_scores, cutoffs)
         else:
-            # If no plot is requested, calculate counts directly
-            conserved_count = count_scores_in_range(phyloP_scores, (args.conserved_min, args.conserved_max))
-            neutral_count = count_scores_in_range(phyloP_scores, (args.neutral_min, args.neutral_max))
-            accelerated_count = count_scores_in_range(phyloP_scores, (args.accelerated_min, args.accelerated_max))
-
-            # Write the summary file with counts
-            write_summary_file(
-                conserved_count,
-                (args.conserved_min, args.conserved_max),
-                neutral_count,
-                (args.neutral_min, args.neutral_max),
-                accelerated_count,
-                (args.accelerated_min, args.accelerated_max),
-                args.output_dir
-            )
-        
-         # Write pre-filtering CSV
-        pre_filter_csv = os.path.join(args.output_dir, "alignment_pre_filter.csv")
-        write_csv(pre_filter_csv, species_names, alignment_matrix, phyloP_scores)
-
-         # Filter rows based on the phyloP threshold
-        filtered_matrix = []
-        filtered_scores = []
-        for row, score in zip(alignment_matrix, phyloP_scores):
-            if args.min_cutoff <= score <= args.max_cutoff:
-                filtered_matrix.append(row)
-                filtered_scores.append(score)
-
-        # Write filtered CSV
-        filtered_csv = os.path.join(args.output_dir, "alignment_filtered.csv")
-        write_csv(filtered_csv, species_names, filtered_matrix, filtered_scores)
-        
-        # Write filtered FASTA
-        filtered_fasta = os.path.join(args.output_dir, "alignment_filtered.fasta")
-        write_fasta(filtered_fasta, species_names, filtered_matrix)
+            # Filter columns based on the phyloP threshold
+            cutoffs = [(args.min_cutoff, args.max_cutoff)]
+            masks = filter_masks(phyloP_scores, cutoffs)
+            keep_mask = masks[0]
+            filtered_matrix = alignment_matrix[:, keep_mask]
+            filtered_scores = phyloP_scores[keep_mask]
+            logging.info(f"{int(keep_mask.sum())} of {len(keep_mask)} sites passed the phyloP filter.")
+
+            # Write filtered CSV
+            if not args.no_csv:
+                filtered_csv = os.path.join(args.output_dir, "alignment_filtered.csv")
+                write_csv(filtered_csv, species_names, filtered_matrix, filtered_scores)
+
+            # Write filtered FASTA
+            filtered_fasta = os.path.join(args.output_dir, "alignment_filtered.fasta")
+            write_fasta(filtered_fasta, species_names, filtered_matrix)
+
+        if args.columnar:
+            write_columnar(args.output_dir, args.columnar, species_names, alignment_matrix, phyloP_scores, masks, cutoffs)
 
         logging.info("Script execution completed successfully.")
 
@@ -252,11 +806,19 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process and filter a FASTA alignment with phyloP scores.")
     parser.add_argument("--fasta", required=True, help="Path to the input FASTA file.")
     parser.add_argument("--phyloP", required=True, help="Path to the file containing phyloP scores.")
+    parser.add_argument("--phyloP_format", choices=["auto", "scores", "wig", "bedgraph"], default="auto", help="Format of the phyloP file: a bare column of scores, fixedStep/variableStep WIG, or bedGraph (default: auto-detect).")
+    parser.add_argument("--chrom", help="Chromosome to take scores from when a WIG/bedGraph covers several chromosomes.")
+    parser.add_argument("--ref_start", type=int, default=1, help="1-based reference position of the first alignment column, used to place WIG/bedGraph scores (default: 1).")
     parser.add_argument("--output_dir", required=True, help="Directory to save output files.")
     parser.add_argument("--plot", required=False, help="Path to save the phyloP score distribution plot (optional).")
     parser.add_argument("--log_file", default="script.log", help="Path to save the log file.")
     parser.add_argument("--min_cutoff", type=float, default="-0.5", help="Minimum phyloP score for filtering cutoff")
     parser.add_argument("--max_cutoff", type=float, default=0.5, help="Maximum phyloP score for filtering cutoff")
+    parser.add_argument("--cutoffs", help="Several (min, max) cutoff bands to filter with in one run: a TSV of min/max pairs, or a list such as --cutoffs=\"-0.25,0.25;-0.5,0.5\". Overrides --min_cutoff/--max_cutoff.")
+    parser.add_argument("--columnar", choices=["npz", "npy"], help="Also save the alignment byte matrix, float32 phyloP scores and filter mask(s) as NumPy arrays: 'npz' (compressed) or 'npy' (memory-mappable directory).")
+    parser.add_argument("--no_csv", "--no-csv", action="store_true", help="Skip writing alignment_pre_filter.csv and alignment_filtered.csv.")
+    parser.add_argument("--stream", action="store_true", help="Filter the alignment in fixed-size column blocks to keep memory use constant (no plot is produced).")
+    parser.add_argument("--block_size", type=int, default=1000000, help="Number of alignment columns per block in --stream mode (default: 1000000).")
 
     # Define optional ranges for conserved, neutral, and accelerated sites
     parser.add_argument("--conserved_min", type=float, default=1.5, help="Minimum score for conserved sites (default: 1.5).")
@@ -265,6 +827,11 @@ if __name__ == "__main__":
     parser.add_argument("--neutral_max", type=float, default=0.5, help="Maximum score for neutral sites (default: 0.5).")
     parser.add_argument("--accelerated_min", type=float, default=-3.0, help="Minimum score for accelerated sites (default: -3.0).")
     parser.add_argument("--accelerated_max", type=float, default=-1.5, help="Maximum score for accelerated sites (default: -1.5).")
+    parser.add_argument("--score_class", nargs=3, action="append", metavar=("LABEL", "MIN", "MAX"), help="Additional score class to count and shade, e.g. '--score_class Strongly_conserved 3.0 10.0'. Can be given more than once.")
+    parser.add_argument("--window_size", type=positive_int, help="Window size (in alignment columns) for a per-window phyloP summary, e.g. 500 to match the sliding-window trees.")
+    parser.add_argument("--step_size", type=positive_int, default=50, help="Step between windows for the per-window phyloP summary (default: 50).")
+    parser.add_argument("--window_format", choices=["tsv", "bedgraph"], default="tsv", help="Write the window summary as a TSV keyed by window number (default) or as a bedGraph of mean phyloP.")
+    parser.add_argument("--bins", type=int, default=50, help="Number of histogram bins for the plot (default: 50).")
 
     args = parser.parse_args()
     main(args)
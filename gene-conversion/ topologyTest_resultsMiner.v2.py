@@ -2,67 +2,153 @@
 Script title: topologyTest_resultsMiner.py
 Author: Emmarie Alexander
 Date written: 2-April-2025
-Last updated: 2-April-2025
+Last updated: 18-October-2026
+Summary v3: The "USER TREES" table is now parsed instead of copied: each report is only read up to the end of the table, every tree row is split into typed columns (logL, deltaL, bp-RELL, p-KH, p-SH, p-WKH, p-WSH, c-ELW, p-AU and each test's +/- flag) and all windows go into one tidy TSV, one row per window and tree. Reports are parsed across a process pool ('--threads').
+Summary v2.1: The output is now rewritten on every run (it used to be appended to, so reruns duplicated windows). Added '--incremental': the size, mtime and extracted table of each report are kept in a harvest manifest (harvest_manifest.py), so a rerun only reads new or changed reports and the output stays in window order.
 Summary v2: Sorting by numerical order (human-sorting), argparse.
 Summary v1: There appears to be differences in the number of treefiles in the unconstrained and constrained directories. I need to modify the script to count number of files and make sure they're the same.
 Purpose: This CLI script works to go through all of the output .iqtree files after performing an alternative topology test. It will extract the statistics from the topology tests performed.
 
+Output columns: window, file, tree, then each statistic; tests are followed by <test>_accepted, which is 1 where IQ-TREE printed '+' (the tree is not rejected) and 0 for '-'.
+Tests that weren't run for a report are left as NA.
 """
 
 import os
 import re
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from harvest_manifest import load_manifest, save_manifest, split_changed
+
+# Every statistic IQ-TREE can print in the USER TREES table, in its order; all but logL and deltaL carry a +/- flag
+STATISTICS = ["logL", "deltaL", "bp-RELL", "p-KH", "p-SH", "p-WKH", "p-WSH", "c-ELW", "p-AU"]
+UNFLAGGED = {"logL", "deltaL"}
+OUTPUT_COLUMNS = ["window", "file", "tree"] + [
+    column for statistic in STATISTICS for column in ([statistic] if statistic in UNFLAGGED else [statistic, f"{statistic}_accepted"])
+]
+
+def window_number(filename):
+    # The number just before the extension (e.g. DDX3YX_treesearch_10.iqtree), or a leading window number as written by window_slicer.py (e.g. 12.fasta.iqtree)
+    match = re.search(r"_(\d+)\.", filename) or re.match(r"(\d+)\.", filename)
+    return int(match.group(1)) if match else float('inf')
+
+def parse_tree_row(line, header):
+    """Splits one row of the table into {column: value}, following the statistics named in the header."""
+    tokens = line.split()
+    row = {"tree": int(tokens[0])}
+    position = 1
+    for statistic in header:
+        row[statistic] = float(tokens[position])
+        position += 1
+        if statistic not in UNFLAGGED and position < len(tokens) and tokens[position] in ("+", "-"):
+            row[f"{statistic}_accepted"] = int(tokens[position] == "+")
+            position += 1
+    return row
+
+def parse_user_trees(file_path):
+    """
+    Reads one .iqtree report up to the end of the "USER TREES" table and returns its tree rows as dicts, or None if there isn't a table.
+    The rest of the report is never read.
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if "USER TREES" in line.upper():
+                break
+        else:
+            return None
+
+        header = None
+        rows = []
+        for line in f:
+            stripped = line.strip()
+            if header is None:
+                if stripped.startswith("Tree") and "logL" in stripped:
+                    header = stripped.split()[1:]
+            elif stripped.startswith("---"):
+                continue
+            elif not stripped:
+                if rows:
+                    break  # A blank line ends the table
+            elif stripped[0].isdigit():
+                rows.append(parse_tree_row(stripped, header))
+            else:
+                break
+        return rows if rows else None
+
+def format_value(value):
+    return "NA" if value is None else str(value)
+
 def main(args):
     """
     Extracts the tree topology results that appear underneath "USER TREES" in the .iqtree report.
 
     input_dir: Path to the folder containing iqtree files.
     file_suffix: File extension specifying .iqtree
-    output_file: Path to the generated output file.
+    output_file: Path to the generated TSV.
+    incremental: Only read reports that are new or changed since the last run (tracked in harvest_manifest).
+    threads: Number of reports parsed in parallel.
     """
     input_dir = args.input_dir
     output_file = args.output_file
     file_suffix = args.file_suffix
 
-    # Get filenames and sort them numerically
-    filenames = sorted(
-        (f for f in os.listdir(input_dir) if f.endswith(file_suffix)),
-        key=lambda x: int(re.search(r"(\d+)", x).group(1)) if re.search(r"(\d+)", x) else float('inf')
-    )
+    # Get the reports from one directory listing (scandir already knows which entries are files) and sort them numerically
+    with os.scandir(input_dir) as entries:
+        reports = sorted(((entry.name, entry.path) for entry in entries if entry.name.endswith(file_suffix) and entry.is_file()), key=lambda report: window_number(report[0]))
+    filenames = [filename for filename, _ in reports]
 
     if not filenames:
         print("No .iqtree files were found in the directory.")
         return
 
-    with open(output_file, "a", encoding="utf-8") as out_file:
-        for filename in filenames:
-            file_path = os.path.join(input_dir, filename)
+    harvest_manifest = (args.harvest_manifest or f"{output_file}.harvest.json") if args.incremental else None
+    if harvest_manifest:
+        manifest = load_manifest(harvest_manifest)
+        records = manifest.setdefault("user_trees", {})
+        changed = split_changed(reports, records)
+    else:
+        # Without --incremental every report is read anyway, so none of them are stat-ed
+        records = {}
+        changed = [(filename, file_path, [None, None]) for filename, file_path in reports]
 
-            if os.path.isfile(file_path):
-                print(f"Processing {filename}")
-                with open(file_path, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
+    print(f"Processing {len(changed)} reports...")
+    with ProcessPoolExecutor(max_workers=args.threads) as pool:
+        parsed = pool.map(parse_user_trees, [file_path for _, file_path, _ in changed], chunksize=64)
+        for (filename, _, signature), rows in zip(changed, parsed):
+            records[filename] = signature + [rows]
+            if rows is None:
+                print(f"No topology test results were found in {filename}.")
+    if harvest_manifest:
+        print(f"{len(changed)} new or changed reports read ({len(filenames) - len(changed)} unchanged).")
 
-                    found = False  # Checks to see if "USER TREES" is found
-                    for i, line in enumerate(lines):
-                        if "USER TREES" in line.upper():
-                            found = True
-                            out_file.write(f"Extracted from: {filename}\n")
-                            out_file.writelines(lines[i:i+9])
-                            out_file.write("\n--\n")
-                            break
+    # The output is rewritten in window order every time, so reruns never duplicate windows
+    n_windows = 0
+    with open(output_file, "w", encoding="utf-8") as out_file:
+        out_file.write("\t".join(OUTPUT_COLUMNS) + "\n")
+        for filename in filenames:
+            rows = records[filename][2]
+            if rows is None:
+                continue
+            n_windows += 1
+            window = window_number(filename)
+            for row in rows:
+                row = dict(row, window=window if window != float('inf') else None, file=filename)
+                out_file.write("\t".join(format_value(row.get(column)) for column in OUTPUT_COLUMNS) + "\n")
 
-                    if not found:
-                        print(f"No topology test results were found in {filename}.")
+    if harvest_manifest:
+        save_manifest(harvest_manifest, manifest)
+    print(f"Topology test results from {n_windows} reports saved to {output_file}.")
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Process .iqtree files and generate an output file containing all topology test results.")
+    parser = argparse.ArgumentParser(description="Process .iqtree files and generate one TSV containing all topology test results.")
     parser.add_argument("--input_dir", required=True, help="Path to the directory containing the .iqtree files.")
-    parser.add_argument("--output_file", required=True, help="Path to the file that will contain the results.")
+    parser.add_argument("--output_file", required=True, help="Path to the TSV that will contain the results.")
     parser.add_argument("--file_suffix", required=True, help="Specify the file extension. This should always be set to .iqtree")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="Number of reports to parse in parallel (default: all cores).")
+    parser.add_argument("--incremental", action="store_true", help="Only read .iqtree files that are new or changed since the last run.")
+    parser.add_argument("--harvest_manifest", help="Harvest manifest used by --incremental (default: <output_file>.harvest.json).")
 
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,445 @@
+"""
+Script title: compact_tree.py
+Author: Emmarie Alexander
+Contact: emmarie.alexander@tamu.edu
+Date written: 18-October-2026
+Date last updated: 18-October-2026
+Purpose: A compact, array-based tree shared by phylo-pruner.py, tree_concatenator.v2.py and the other tree scripts, so that Newick files do not have to be turned into one ete3 object per node on every run.
+A tree is stored as a handful of NumPy arrays with nodes numbered in postorder (children before their parent, root last):
+    parent         - index of each node's parent (-1 for the root)
+    child_offset   - child_index[child_offset[i]:child_offset[i + 1]] are the children of node i, in Newick order
+    branch_length  - length of the branch above each node (NaN if the Newick had none)
+    name_id        - index into the interned name table (-1 if the node is unnamed)
+Pruning, rerooting, making the tree ultrametric, listing bipartitions and writing Newick all work on these arrays directly; to_ete3() is there for anything else.
+load_trees(use_cache=True) keeps a binary cache of a parsed file, keyed by a hash of the file's path, size and mtime, so loading the same file again skips the parse.
+The cache is opt-in: it pays off for large trees that are read again and again (e.g. a reference phylogeny), not for thousands of small window trees, where every cache entry is one more file to create.
+Bracketed comments such as the GHOST [a/b/c/d] rate annotations are ignored when parsing.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import zipfile
+
+import numpy as np
+
+CACHE_DIR = os.environ.get("COMPACT_TREE_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "phylogen-y", "trees"))
+NEWICK_TOKENS = re.compile(r"\[[^\]]*\]|'[^']*'|[(),;]|:[^,();\[]*|[^,();:\[\]']+")
+
+
+class CompactTree:
+    def __init__(self, parent, branch_length, name_id, names):
+        self.parent = np.asarray(parent, dtype=np.int32)
+        self.branch_length = np.asarray(branch_length, dtype=np.float64)
+        self.name_id = np.asarray(name_id, dtype=np.int32)
+        self.names = names  # Shared name table; several trees from one file use the same list
+        # Children in CSR form. Postorder numbering means a stable sort by parent keeps each node's children in Newick order
+        order = np.argsort(self.parent, kind="stable")
+        self.child_index = order[self.parent[order] >= 0].astype(np.int32)
+        counts = np.bincount(self.parent[self.parent >= 0], minlength=len(self.parent))
+        self.child_offset = np.concatenate(([0], np.cumsum(counts))).astype(np.int32)
+
+    @property
+    def n_nodes(self):
+        return len(self.parent)
+
+    @property
+    def root(self):
+        return self.n_nodes - 1
+
+    def children(self, node):
+        return self.child_index[self.child_offset[node]:self.child_offset[node + 1]]
+
+    def is_leaf(self):
+        """Boolean array marking the leaves."""
+        return np.diff(self.child_offset) == 0
+
+    def leaves(self):
+        return np.flatnonzero(self.is_leaf())
+
+    def node_name(self, node):
+        name_id = self.name_id[node]
+        return self.names[name_id] if name_id >= 0 else ""
+
+    def leaf_names(self):
+        return [self.node_name(leaf) for leaf in self.leaves()]
+
+    def prune(self, keep_names):
+        """
+        Keep only the leaves named in keep_names, in one bottom-up pass. Internal nodes left with a single child are
+        collapsed into that child and their branch lengths are summed, as ete3's prune(preserve_branch_length=True) does.
+        """
+        keep_ids = {i for i, name in enumerate(self.names) if name in keep_names}
+        is_leaf = self.is_leaf()
+        mapped = np.full(self.n_nodes, -1, dtype=np.int64)  # New node standing in for each old node
+        parent, lengths, name_ids = [], [], []
+        for node in range(self.n_nodes):
+            if is_leaf[node]:
+                if self.name_id[node] in keep_ids:
+                    mapped[node] = len(parent)
+                    parent.append(-1)
+                    lengths.append(self.branch_length[node])
+                    name_ids.append(self.name_id[node])
+                continue
+            kept = [mapped[child] for child in self.children(node) if mapped[child] >= 0]
+            if len(kept) == 1:
+                # Collapse the unary node into its only remaining child
+                mapped[node] = kept[0]
+                lengths[kept[0]] = add_lengths(lengths[kept[0]], self.branch_length[node])
+            elif kept:
+                mapped[node] = len(parent)
+                for child in kept:
+                    parent[child] = len(parent)
+                parent.append(-1)
+                lengths.append(self.branch_length[node])
+                name_ids.append(self.name_id[node])
+
+        if not parent:
+            raise ValueError("None of the requested taxa were found in the tree!")
+        return renumber_postorder(parent, lengths, name_ids, self.names, mapped[self.root])
+
+    def reroot(self, outgroup):
+        """Root the tree on the middle of the branch above the outgroup (a leaf name, or a list of leaf names whose MRCA is used)."""
+        outgroup_node = self.mrca([outgroup] if isinstance(outgroup, str) else list(outgroup))
+        if outgroup_node == self.root:
+            raise ValueError("The outgroup already contains every leaf; pick a smaller outgroup.")
+
+        # Treat the tree as undirected, then walk it from a new root placed on the outgroup's branch
+        neighbours = [[] for _ in range(self.n_nodes)]
+        for node in range(self.n_nodes - 1):
+            up = int(self.parent[node])
+            neighbours[node].append((up, self.branch_length[node]))
+            neighbours[up].append((node, self.branch_length[node]))
+        half = self.branch_length[outgroup_node] / 2
+        above = int(self.parent[outgroup_node])
+
+        parent, lengths, name_ids = [], [], []
+        new_root_children = []
+        for start in (outgroup_node, above):
+            new_root_children.append(self._copy_subtree(start, outgroup_node if start == above else above, half, neighbours, parent, lengths, name_ids))
+        # Like ete3's set_outgroup, the new root sits halfway along the path between its two children
+        middist = add_lengths(lengths[new_root_children[0]], lengths[new_root_children[1]]) / 2
+        for child in new_root_children:
+            parent[child] = len(parent)
+            lengths[child] = middist
+        parent.append(-1)
+        lengths.append(np.nan)
+        name_ids.append(-1)
+        return CompactTree(parent, lengths, name_ids, self.names)
+
+    def _copy_subtree(self, start, came_from, start_length, neighbours, parent, lengths, name_ids):
+        """Copy the subtree hanging off start (away from came_from) in postorder, collapsing the old root if it becomes unary."""
+        # Iterative DFS: each stack entry is (node, the node we came from, branch length above it, expanded?)
+        stack = [(start, came_from, start_length, False)]
+        results = {}
+        while stack:
+            node, previous, length, expanded = stack.pop()
+            below = [(other, other_length) for other, other_length in neighbours[node] if other != previous]
+            if not expanded:
+                stack.append((node, previous, length, True))
+                for other, other_length in reversed(below):
+                    stack.append((other, node, other_length, False))
+                continue
+            kept = [results.pop(other) for other, _ in below]
+            if len(kept) == 1:
+                # The old root now has one child: merge its two branches into one
+                results[node] = kept[0]
+                lengths[kept[0]] = add_lengths(lengths[kept[0]], length)
+                continue
+            for child in kept:
+                parent[child] = len(parent)
+            results[node] = len(parent)
+            parent.append(-1)
+            lengths.append(length)
+            name_ids.append(self.name_id[node])
+        return results[start]
+
+    def mrca(self, leaf_names):
+        """Most recent common ancestor of the named leaves."""
+        wanted = {self.names.index(name) for name in leaf_names if name in self.names}
+        leaves = [leaf for leaf in self.leaves() if self.name_id[leaf] in wanted]
+        if len(leaves) != len(set(leaf_names)):
+            raise ValueError(f"Not every outgroup taxon was found in the tree: {', '.join(leaf_names)}")
+        # Count the requested leaves under every node; the first node (in postorder) holding all of them is the MRCA
+        counts = np.zeros(self.n_nodes, dtype=np.int64)
+        counts[leaves] = 1
+        for node in range(self.n_nodes - 1):
+            counts[self.parent[node]] += counts[node]
+            if counts[node] == len(leaves):
+                return node
+        return self.root
+
+    def bipartitions(self, taxon_bits):
+        """
+        Non-trivial splits of the (unrooted) tree as integer bitsets, with taxon_bits mapping each leaf name to its bit.
+        Each split is written as the side without the lowest-numbered taxon, so the same split from any tree or rooting
+        gives the same integer and splits can be compared with plain set operations.
+        """
+        bits = [0] * self.n_nodes
+        for leaf in self.leaves():
+            bits[leaf] = 1 << taxon_bits[self.node_name(leaf)]
+        for node in range(self.n_nodes - 1):  # Postorder: every child is finished before its parent
+            bits[self.parent[node]] |= bits[node]
+        full = bits[self.root]
+        lowest = full & -full
+        n_taxa = full.bit_count()
+        splits = set()
+        for split in bits[:-1]:
+            if split & lowest:
+                split ^= full
+            if 1 < split.bit_count() < n_taxa - 1:
+                splits.add(split)
+        return splits
+
+    def canonical_topology(self):
+        """
+        Newick string of the unrooted topology alone (no branch lengths, internal names or comments) that is the same for
+        every rooting and child order: the tree is written from the alphabetically first leaf, with the subtrees at each
+        node sorted by their first leaf name.
+        """
+        # Undirected adjacency; a two-child root is dropped so rooted and unrooted inputs give the same graph
+        neighbours = [[] for _ in range(self.n_nodes)]
+        root_children = self.children(self.root)
+        for node in range(self.n_nodes - 1):
+            if self.parent[node] == self.root and len(root_children) == 2:
+                continue
+            neighbours[node].append(int(self.parent[node]))
+            neighbours[int(self.parent[node])].append(node)
+        if len(root_children) == 2:
+            first, second = int(root_children[0]), int(root_children[1])
+            neighbours[first].append(second)
+            neighbours[second].append(first)
+
+        is_leaf = self.is_leaf()
+        start = min(self.leaves(), key=self.node_name)
+        if not neighbours[start]:
+            return f"({quote_name(self.node_name(start))});"
+        # Iterative postorder walk away from the first leaf; each subtree is kept as (first leaf name, Newick)
+        results = {}
+        stack = [(int(neighbours[start][0]), int(start), False)]
+        while stack:
+            node, came_from, expanded = stack.pop()
+            below = [other for other in neighbours[node] if other != came_from]
+            if is_leaf[node] and not below:
+                name = self.node_name(node)
+                results[node] = (name, quote_name(name))
+            elif not expanded:
+                stack.append((node, came_from, True))
+                stack.extend((other, node, False) for other in below)
+            else:
+                subtrees = sorted(results.pop(other) for other in below)
+                results[node] = (subtrees[0][0], "(" + ",".join(newick for _, newick in subtrees) + ")")
+        hub = int(neighbours[start][0])
+        hub_subtrees = results[hub][1][1:-1] if not is_leaf[hub] else results[hub][1]
+        return f"({quote_name(self.node_name(start))},{hub_subtrees});"
+
+    def convert_to_ultrametric(self, tree_length=None):
+        """Same as ete3's convert_to_ultrametric(strategy='balanced'), in place: each node's depth is spread evenly over the splits below it."""
+        max_depth = np.ones(self.n_nodes, dtype=np.int64)
+        root_distance = np.zeros(self.n_nodes)
+        lengths = np.nan_to_num(self.branch_length)
+        for node in range(self.n_nodes - 1):
+            max_depth[self.parent[node]] = max(max_depth[self.parent[node]], max_depth[node] + 1)
+        for node in range(self.n_nodes - 2, -1, -1):  # Reverse postorder visits parents before children
+            root_distance[node] = root_distance[self.parent[node]] + lengths[node]
+        if not tree_length:
+            tree_length = root_distance[self.is_leaf()].max()
+
+        node_distance = np.zeros(self.n_nodes)
+        for node in range(self.n_nodes - 2, -1, -1):
+            up = self.parent[node]
+            self.branch_length[node] = (tree_length - node_distance[up]) / max_depth[node]
+            node_distance[node] = self.branch_length[node] + node_distance[up]
+        return self
+
+    def to_newick(self, internal_names=True):
+        """Write the tree as Newick with branch lengths, in the same style as ete3's write(format=1)."""
+        is_leaf = self.is_leaf()
+        subtrees = [None] * self.n_nodes
+        for node in range(self.n_nodes):
+            # Like ete3's format=1, internal names are written but the root's name is not
+            label = quote_name(self.node_name(node)) if (is_leaf[node] or (internal_names and node != self.root)) else ""
+            if not is_leaf[node]:
+                label = "(" + ",".join(subtrees[child] for child in self.children(node)) + ")" + label
+                for child in self.children(node):
+                    subtrees[child] = None  # Free the child strings as soon as they are used
+            length = self.branch_length[node]
+            subtrees[node] = label if (node == self.root or np.isnan(length)) else f"{label}:{length:0.6g}"
+        return subtrees[self.root] + ";"
+
+    def to_ete3(self):
+        """Convert to an ete3 Tree, only for when something needs ete3 itself."""
+        from ete3 import Tree
+        return Tree(self.to_newick(), format=1)
+
+
+def add_lengths(first, second):
+    """Sum two branch lengths, treating a missing (NaN) length as 0 unless both are missing."""
+    if np.isnan(first):
+        return second
+    return first if np.isnan(second) else first + second
+
+
+def quote_name(name):
+    return f"'{name}'" if re.search(r"[\s(),:;\[\]']", name) else name
+
+
+def renumber_postorder(parent, lengths, name_ids, names, root):
+    """Drop any nodes not below root and renumber the rest so the tree is in postorder again."""
+    parent = np.asarray(parent, dtype=np.int64)
+    n_nodes = len(parent)
+    children = [[] for _ in range(n_nodes)]
+    for node, up in enumerate(parent):
+        if up >= 0:
+            children[up].append(node)
+    order = []
+    stack = [(int(root), False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            order.append(node)
+            continue
+        stack.append((node, True))
+        stack.extend((child, False) for child in reversed(children[node]))
+    new_id = np.full(n_nodes, -1, dtype=np.int64)
+    new_id[order] = np.arange(len(order))
+    new_parent = np.where(parent[order] >= 0, new_id[np.maximum(parent[order], 0)], -1)
+    new_parent[-1] = -1
+    return CompactTree(new_parent, np.asarray(lengths, dtype=np.float64)[order], np.asarray(name_ids)[order], names)
+
+
+def parse_newick(text, names=None, name_lookup=None):
+    """Parse every tree in a Newick string into CompactTrees that share one interned name table."""
+    names = [] if names is None else names
+    name_lookup = {name: i for i, name in enumerate(names)} if name_lookup is None else name_lookup
+    trees = []
+    parent, lengths, name_ids = [], [], []
+    frames = []  # Children collected for each open parenthesis
+    last = None  # Node the next label or branch length belongs to
+    previous = ","
+
+    def new_node(children):
+        node = len(parent)
+        for child in children:
+            parent[child] = node
+        parent.append(-1)
+        lengths.append(np.nan)
+        name_ids.append(-1)
+        if frames:
+            frames[-1].append(node)
+        return node
+
+    for token in NEWICK_TOKENS.findall(text):
+        if token.startswith("[") or not token.strip():
+            continue  # Comments (e.g. GHOST rate annotations) and whitespace between tokens
+        if token == "(":
+            frames.append([])
+        elif token in (",", ")", ";") and previous in ("(", ","):
+            last = new_node([])  # Unnamed leaf, e.g. "(,)"
+        if token == ")":
+            children = frames.pop()
+            last = new_node(children)
+        elif token == ";":
+            if parent:
+                trees.append(CompactTree(parent, lengths, name_ids, names))
+            parent, lengths, name_ids, frames, last = [], [], [], [], None
+        elif token.startswith(":"):
+            lengths[last] = float(token[1:]) if token[1:].strip() else np.nan
+        elif token not in ("(", ","):
+            name = token.strip().strip("'")
+            if previous in ("(", ","):
+                last = new_node([])
+            if name not in name_lookup:
+                name_lookup[name] = len(names)
+                names.append(name)
+            name_ids[last] = name_lookup[name]
+        previous = token
+    return trees
+
+
+def merge_trees(trees):
+    """Join trees under a new root, as tree_concatenator does with ete3's add_child."""
+    names, name_lookup = [], {}
+    parent, lengths, name_ids = [], [], []
+    roots = []
+    for tree in trees:
+        # Trees read from different files have their own name tables, so map them onto one shared table
+        remap = np.array([name_lookup.setdefault(name, len(name_lookup)) for name in tree.names] + [-1], dtype=np.int64)
+        offset = len(parent)
+        parent.extend(np.where(tree.parent >= 0, tree.parent + offset, -1).tolist())
+        lengths.extend(tree.branch_length.tolist())
+        name_ids.extend(remap[tree.name_id].tolist())  # -1 (unnamed) picks the trailing -1
+        roots.append(offset + tree.root)
+    names.extend(name_lookup)
+    for root in roots:
+        parent[root] = len(parent)
+    parent.append(-1)
+    lengths.append(np.nan)
+    name_ids.append(-1)
+    return CompactTree(parent, lengths, name_ids, names)
+
+
+def cache_path(tree_file, cache_dir=None):
+    """Cache file for a tree file, keyed by a hash of its absolute path, size and modification time."""
+    stat = os.stat(tree_file)
+    key = hashlib.sha1(f"{os.path.abspath(tree_file)}|{stat.st_size}|{stat.st_mtime_ns}".encode()).hexdigest()
+    return os.path.join(cache_dir or CACHE_DIR, f"{os.path.basename(tree_file)}.{key[:16]}.ctree.npz")
+
+
+def save_cache(path, trees):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    names = trees[0].names if trees else []
+    # A unique temporary file per writer, so processes caching the same tree at once can't clobber each other
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".npz")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            np.savez(
+                tmp,
+                node_counts=np.array([tree.n_nodes for tree in trees], dtype=np.int64),
+                parent=np.concatenate([tree.parent for tree in trees]) if trees else np.empty(0, np.int32),
+                branch_length=np.concatenate([tree.branch_length for tree in trees]) if trees else np.empty(0),
+                name_id=np.concatenate([tree.name_id for tree in trees]) if trees else np.empty(0, np.int32),
+                names=np.frombuffer("\n".join(names).encode(), dtype=np.uint8),
+            )
+        os.replace(tmp_path, path)  # So a half-written cache is never picked up
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_cache(path):
+    with np.load(path) as cache:
+        names = cache["names"].tobytes().decode().split("\n") if len(cache["names"]) else []
+        bounds = np.concatenate(([0], np.cumsum(cache["node_counts"])))
+        return [
+            CompactTree(cache["parent"][start:end], cache["branch_length"][start:end], cache["name_id"][start:end], names)
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+
+
+def load_trees(tree_file, use_cache=False, cache_dir=None):
+    """Read every tree in a Newick file; with use_cache, from the binary cache if this exact file has been read before."""
+    path = cache_path(tree_file, cache_dir) if use_cache else None
+    if path and os.path.exists(path):
+        try:
+            return read_cache(path)
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile) as e:
+            # An unreadable cache entry counts as a miss; it is re-parsed and replaced below
+            print(f"Warning: ignoring unreadable tree cache {path}: {e}")
+    with open(tree_file, "r") as f:
+        trees = parse_newick(f.read())
+    if path:
+        try:
+            save_cache(path, trees)
+        except OSError as e:
+            print(f"Warning: could not write tree cache {path}: {e}")
+    return trees
+
+
+def load_tree(tree_file, use_cache=False, cache_dir=None):
+    """Read the first tree in a Newick file."""
+    trees = load_trees(tree_file, use_cache, cache_dir)
+    if not trees:
+        raise ValueError(f"No trees were found in {tree_file}.")
+    return trees[0]
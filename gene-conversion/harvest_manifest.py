@@ -0,0 +1,55 @@
+"""
+Script title: harvest_manifest.py
+Author: Emmarie Alexander
+Contact: emmarie.alexander@tamu.edu
+Date written: 18-October-2026
+Date last updated: 18-October-2026
+Purpose: Small processed-file manifest shared by iqtree-arborist, treeFile_merger and topologyTest_resultsMiner so that reruns only read new or changed window files.
+Each harvested file is recorded as filename -> [size, mtime_ns, result], where result is whatever the script pulled out of the file (a Newick line, a topology-test table, ...).
+A file is re-read only if its size or modification time changed, so harvesting can be rerun while IQ-TREE is still writing windows.
+The manifest is a JSON file with one section per input directory or file type, and is replaced atomically on save.
+"""
+
+import json
+import os
+
+
+def load_manifest(manifest_file):
+    """Read a manifest, or start an empty one if the file doesn't exist yet."""
+    if not manifest_file or not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest_file, manifest):
+    # Write to a temporary file first so an interrupted run never leaves a half-written manifest behind
+    tmp_file = f"{manifest_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_file, manifest_file)
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def split_changed(files, records):
+    """
+    Compare the (filename, path) pairs found on disk against one manifest section.
+
+    records: filename -> [size, mtime_ns, result]; updated in place so files that have disappeared are dropped.
+    Returns the (filename, path, signature) triples that are new or have changed since they were recorded.
+    """
+    current = {name for name, _ in files}
+    for name in list(records):
+        if name not in current:
+            del records[name]
+
+    changed = []
+    for name, path in files:
+        signature = file_signature(path)
+        if records.get(name, [None, None])[:2] != signature:
+            changed.append((name, path, signature))
+    return changed
@@ -3,68 +3,136 @@ Script title: iqtree-arborist.v2.py
 Author: Emmarie Alexander
 Contact: emmarie.alexander@tamu.edu
 Date written: 21-Feb-2025
-Date last updated: 26-June-2025
+Date last updated: 18-Oct-2026
 Purpose: When performing a sliding window analysis, IQ-TREE will be ran individually for each window, outputting a series of files. The most important of these files will be the .treefile, which contains the best tree. However, since the GHOST model is used, a tree is provided for each parameter (i.e., 4 trees).
 The purpose of this CLI script is to extract the best tree (or the first line) for each file (or window) from the .treefile.
+Update (Oct-2026): The input directory is listed once with os.scandir, only the first line of each treefile is read (across a thread pool), and the raw and GHOST-cleaned outputs are written in the same pass.
+The treefiles are no longer copied by default: '--copy_mode manifest' (default) records where each treefile lives, 'hardlink' links them into --output_dir without copying data, and 'copy' keeps the old behaviour.
+With '--incremental', the size, mtime and first line of every treefile are kept in a harvest manifest (see harvest_manifest.py); reruns only read new or changed treefiles and rewrite the outputs in window order, so windows can be harvested while IQ-TREE is still running.
 """
 
 import os
 import shutil
 import argparse
 import re
+from concurrent.futures import ThreadPoolExecutor
+
+from harvest_manifest import load_manifest, save_manifest, split_changed
+
+# GHOST rate annotations, e.g. [0.1234/0.2345/0.3456/0.4567]
+GHOST_PATTERN = re.compile(r"\[\d+\.\d+/\d+\.\d+/\d+\.\d+/\d+\.\d+\]")
 
 def extract_int_from_filename(filename):
-    # Adjust this regex if your numbering scheme changes
-    match = re.search(r'_(\d+)\.tre$', filename)
+    # Adjust these regexes if your numbering scheme changes: <name>_<n>.tre, or a leading window number as written by window_slicer.py (e.g. 12.fasta.treefile)
+    match = re.search(r'_(\d+)\.tre$', filename) or re.match(r'(\d+)\.', filename)
     return int(match.group(1)) if match else float('inf')
 
-def copy_and_extract(input_dir, output_dir, output_file, file_extension):
+def read_first_line(path):
+    with open(path, "r", encoding="utf-8") as in_f:
+        return in_f.readline().strip()
+
+def gather_treefiles(input_dir, file_extension):
+    # One directory listing; scandir already knows which entries are files, so there is no extra stat per file
+    with os.scandir(input_dir) as entries:
+        tre_files = [(entry.name, entry.path) for entry in entries if entry.name.endswith(file_extension) and entry.is_file()]
+    # Sort files by the integer in their name
+    tre_files.sort(key=lambda item: extract_int_from_filename(item[0]))
+    return tre_files
+
+def place_treefiles(tre_files, output_dir, copy_mode, overwrite=False):
+    """
+    Hardlink or copy the treefiles into output_dir, renaming any that would clash with what is already there.
+    With overwrite (used by incremental reruns), a changed treefile replaces its earlier copy instead.
+    """
     os.makedirs(output_dir, exist_ok=True)
+    with os.scandir(output_dir) as entries:
+        taken = {entry.name for entry in entries}
+    for file, src_path in tre_files:
+        dest_name = file
+        file_name, file_ext = os.path.splitext(file)
+        counter = 1
+        if overwrite and dest_name in taken:
+            os.remove(os.path.join(output_dir, dest_name))
+            taken.discard(dest_name)
+        while dest_name in taken:
+            dest_name = f"{file_name}_{counter}{file_ext}"
+            counter += 1
+        taken.add(dest_name)
+        dest_path = os.path.join(output_dir, dest_name)
+        if copy_mode == "hardlink":
+            try:
+                os.link(src_path, dest_path)
+                continue
+            except OSError:
+                pass  # e.g. a different filesystem; fall back to copying this one
+        shutil.copy(src_path, dest_path)
 
-    # Gather all .tre files in the input directory
-    tre_files = [
-        f for f in os.listdir(input_dir)
-        if f.endswith(file_extension) and os.path.isfile(os.path.join(input_dir, f))
-    ]
+def copy_and_extract(input_dir, output_dir, output_file, file_extension, cleaned_file=None, copy_mode="manifest", threads=8, harvest_manifest=None):
+    tre_files = gather_treefiles(input_dir, file_extension)
 
-    # Sort files by the integer in their name
-    tre_files.sort(key=extract_int_from_filename)
+    if harvest_manifest:
+        manifest = load_manifest(harvest_manifest)
+        records = manifest.setdefault("treefiles", {})
+        changed = split_changed(tre_files, records)
+    else:
+        # Without --incremental every treefile is read anyway, so none of them are stat-ed
+        records = {}
+        changed = [(file, path, [None, None]) for file, path in tre_files]
 
-    with open(output_file, "w", encoding="utf-8") as out_f:
-        for file in tre_files:
-            src_path = os.path.join(input_dir, file)
-            dest_path = os.path.join(output_dir, file)
-            counter = 1
-            while os.path.exists(dest_path):
-                file_name, file_ext = os.path.splitext(file)
-                dest_path = os.path.join(output_dir, f"{file_name}_{counter}{file_ext}")
-                counter += 1
+    # Only the first line of each file is needed, so the reads are spread over threads (they are I/O bound)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for (file, _, signature), first_line in zip(changed, pool.map(read_first_line, [path for _, path, _ in changed])):
+            records[file] = signature + [first_line]
 
-            shutil.copy(src_path, dest_path)
-            with open(src_path, "r", encoding="utf-8") as in_f:
-                first_line = in_f.readline().strip()
+    # The outputs are always rewritten in window order, so new windows slot in where they belong
+    with open(output_file, "w", encoding="utf-8") as out_f:
+        clean_f = open(cleaned_file, "w", encoding="utf-8") if cleaned_file else None
+        try:
+            for file, _ in tre_files:
+                first_line = records[file][2]
                 out_f.write(first_line + "\n")
+                if clean_f:
+                    clean_f.write(GHOST_PATTERN.sub("", first_line) + "\n")
+        finally:
+            if clean_f:
+                clean_f.close()
 
-    print(f"Process complete! All .treefiles copied to {output_dir} and first lines extracted to {output_file}.")
+    if harvest_manifest:
+        save_manifest(harvest_manifest, manifest)
+        print(f"{len(changed)} new or changed treefiles read ({len(tre_files) - len(changed)} unchanged).")
 
-def output_cleaner(output_file, cleaned_file):
-    pattern = r"\[\d+\.\d+/\d+\.\d+/\d+\.\d+/\d+\.\d+\]"
-    with open(output_file, "r", encoding="utf-8") as infile, open(cleaned_file, "w", encoding="utf-8") as outfile:
-        for line in infile:
-            cleaned_line = re.sub(pattern, "", line)
-            outfile.write(cleaned_line)
-    print(f"Your file is squeaky clean! Processed lines saved to {cleaned_file}.")
+    if copy_mode == "manifest":
+        manifest_file = os.path.join(output_dir, "treefile_manifest.tsv") if output_dir else f"{output_file}.manifest.tsv"
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(manifest_file, "w", encoding="utf-8") as manifest:
+            manifest.write("line\twindow\ttreefile\n")
+            for line_number, (file, src_path) in enumerate(tre_files, start=1):
+                manifest.write(f"{line_number}\t{extract_int_from_filename(file)}\t{os.path.abspath(src_path)}\n")
+        print(f"Process complete! {len(tre_files)} first lines extracted to {output_file}; treefile locations listed in {manifest_file}.")
+    else:
+        # Incremental reruns only need to place the treefiles that changed
+        place_treefiles([(file, path) for file, path, _ in changed] if harvest_manifest else tre_files, output_dir, copy_mode, overwrite=bool(harvest_manifest))
+        print(f"Process complete! All .treefiles {'linked' if copy_mode == 'hardlink' else 'copied'} to {output_dir} and first lines extracted to {output_file}.")
+    if cleaned_file:
+        print(f"Your file is squeaky clean! Processed lines saved to {cleaned_file}.")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
-        description="Copy .treefiles from a directory, extract first lines, and clean output."
+        description="Extract the first line of each .treefile and write raw and GHOST-cleaned outputs in one pass."
     )
     parser.add_argument("--input_dir", required=True, help="Directory containing your .treefiles.")
     parser.add_argument("--file_extension", default=".tre", help="File extension for tree files (default: .tre).")
-    parser.add_argument("--output_dir", required=True, help="Directory to copy treefiles into.")
+    parser.add_argument("--output_dir", help="Directory for linked/copied treefiles, or for the treefile manifest.")
     parser.add_argument("--output_file", required=True, help="File to store the extracted first lines.")
     parser.add_argument("--cleaned_file", required=True, help="File to store the cleaned output.")
+    parser.add_argument("--copy_mode", choices=["manifest", "hardlink", "copy"], default="manifest", help="Write a manifest of treefile paths (default), hardlink them into --output_dir, or copy them as before.")
+    parser.add_argument("--threads", type=int, default=8, help="Number of threads reading treefiles (default: 8).")
+    parser.add_argument("--incremental", action="store_true", help="Only read treefiles that are new or changed since the last run (tracked in --harvest_manifest).")
+    parser.add_argument("--harvest_manifest", help="Harvest manifest used by --incremental (default: <output_file>.harvest.json).")
 
     args = parser.parse_args()
-    copy_and_extract(args.input_dir, args.output_dir, args.output_file, args.file_extension)
-    output_cleaner(args.output_file, args.cleaned_file)
+    if args.copy_mode != "manifest" and not args.output_dir:
+        parser.error("--output_dir is required with --copy_mode hardlink or copy.")
+    harvest_manifest = (args.harvest_manifest or f"{args.output_file}.harvest.json") if args.incremental else None
+    copy_and_extract(args.input_dir, args.output_dir, args.output_file, args.file_extension, args.cleaned_file, args.copy_mode, args.threads, harvest_manifest)
@@ -0,0 +1,162 @@
+"""
+Script title: rf_screen.py
+Author: Emmarie Alexander
+Contact: emmarie.alexander@tamu.edu
+Date written: 18-October-2026
+Date last updated: 18-October-2026
+Purpose: Pre-screen sliding-window trees before the AU topology tests. Every window tree and every hypothesis tree (e.g. topology_tests/HRA_all_alternative_hypotheses.treefile) is turned into its set of bipartitions, and the Robinson-Foulds (RF) distance from each window to each hypothesis is computed.
+A window whose tree already matches the null hypothesis (normalized RF <= '--max_nrf' to '--null_hypothesis', by default the first tree in the hypotheses file) has no topological signal for gene conversion, so it's flagged as not needing the IQ-TREE -z/-au run.
+Splits are stored as integer bitsets (CompactTree.bipartitions in compact_tree.py), and the splits shared with each hypothesis are counted for all windows at once with NumPy, so the screen takes seconds even for tens of thousands of windows.
+If a window tree has a different set of taxa from the hypotheses, both are pruned to the taxa they share before comparing.
+
+Window trees can come from:
+    --trees          - one tree per line, e.g. the cleaned output of iqtree-arborist.v2.py (window = line number, or the window column of arborist's --treefile_manifest)
+    --merged_dir     - the per-window files from treeFile_merger.v3.py (the first, unconstrained tree of each file is used)
+    --store          - the SQLite window store from treeFile_merger.v3.py --store
+
+Output TSV columns: window, n_taxa, rf_H<n> and nrf_H<n> for each hypothesis, closest_hypothesis and needs_au_test (1/0).
+
+Example usage:
+python rf_screen.py --hypotheses HRA_all_alternative_hypotheses.treefile --trees DDX3YX_cleaned.tre --treefile_manifest DDX3YX_treefiles/treefile_manifest.tsv --output DDX3YX_rf_screen.tsv --test_list DDX3YX_windows_to_test.txt
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+
+from compact_tree import load_trees, parse_newick
+
+
+def read_window_trees(args):
+    """Returns (window numbers, Newick strings) from --trees, --merged_dir or --store, in window order."""
+    if args.trees:
+        with open(args.trees, "r") as f:
+            newicks = [line.strip() for line in f]
+        windows = list(range(1, len(newicks) + 1))
+        if args.treefile_manifest:
+            # iqtree-arborist's manifest maps each output line to its window number
+            with open(args.treefile_manifest, "r") as f:
+                next(f)
+                line_to_window = {int(fields[0]): int(fields[1]) for fields in (line.rstrip("\n").split("\t") for line in f) if fields[1] != "inf"}
+            windows = [line_to_window.get(line, line) for line in windows]
+    elif args.merged_dir:
+        pattern = re.compile(r"_(\d+)" + re.escape(args.merged_suffix) + "$")
+        files = sorted(
+            (int(match.group(1)), name) for name in os.listdir(args.merged_dir) if (match := pattern.search(name))
+        )
+        windows, newicks = [], []
+        for window, name in files:
+            with open(os.path.join(args.merged_dir, name), "r") as f:
+                windows.append(window)
+                newicks.append(f.readline().strip())
+    else:
+        with closing(sqlite3.connect(args.store)) as conn:
+            rows = conn.execute("SELECT window, unconstrained FROM window_trees ORDER BY window").fetchall()
+        windows = [window for window, _ in rows]
+        newicks = [newick for _, newick in rows]
+    return windows, newicks
+
+
+def screen_group(window_trees, hypotheses, taxa):
+    """
+    RF distances from every window tree to every hypothesis, with all trees restricted to taxa.
+    Returns (rf, nrf) arrays of shape (n_windows, n_hypotheses).
+    """
+    taxon_bits = {name: bit for bit, name in enumerate(sorted(taxa))}
+    hypothesis_splits = [
+        (tree if set(tree.leaf_names()) == taxa else tree.prune(taxa)).bipartitions(taxon_bits) for tree in hypotheses
+    ]
+
+    # One row per distinct hypothesis split saying which hypotheses contain it; the extra last row is for splits in no hypothesis
+    split_row = {}
+    for splits in hypothesis_splits:
+        for split in splits:
+            split_row.setdefault(split, len(split_row))
+    incidence = np.zeros((len(split_row) + 1, len(hypotheses)), dtype=np.int64)
+    for h, splits in enumerate(hypothesis_splits):
+        incidence[[split_row[split] for split in splits], h] = 1
+
+    # Look every window split up once, then count shared splits for all windows and hypotheses in one go
+    window_split_rows, window_index, n_window_splits = [], [], []
+    for i, tree in enumerate(window_trees):
+        splits = (tree if set(tree.leaf_names()) == taxa else tree.prune(taxa)).bipartitions(taxon_bits)
+        window_split_rows.extend(split_row.get(split, -1) for split in splits)
+        window_index.extend([i] * len(splits))
+        n_window_splits.append(len(splits))
+    shared = np.zeros((len(window_trees), len(hypotheses)), dtype=np.int64)
+    np.add.at(shared, np.asarray(window_index, dtype=np.int64), incidence[np.asarray(window_split_rows, dtype=np.int64)])
+
+    totals = np.asarray(n_window_splits)[:, None] + np.asarray([len(splits) for splits in hypothesis_splits])[None, :]
+    rf = totals - 2 * shared
+    nrf = np.divide(rf, totals, out=np.zeros(rf.shape), where=totals > 0)
+    return rf, nrf
+
+
+def main(args):
+    hypotheses = load_trees(args.hypotheses, use_cache=False)
+    if not hypotheses:
+        raise ValueError(f"No trees were found in {args.hypotheses}.")
+    if not 1 <= args.null_hypothesis <= len(hypotheses):
+        raise ValueError(f"--null_hypothesis must be between 1 and {len(hypotheses)}.")
+    hypothesis_taxa = set(hypotheses[0].leaf_names())
+
+    windows, newicks = read_window_trees(args)
+    names, name_lookup = [], {}
+    parsed = [parse_newick(newick, names, name_lookup) if newick else [] for newick in newicks]
+    kept = [(window, trees[0]) for window, trees in zip(windows, parsed) if trees]
+    if len(kept) < len(windows):
+        print(f"Warning: {len(windows) - len(kept)} windows had no tree and were left out.")
+
+    # Windows are grouped by their taxon set so each group's hypotheses only need pruning once
+    groups = {}
+    for i, (_, tree) in enumerate(kept):
+        groups.setdefault(frozenset(tree.leaf_names()) & hypothesis_taxa, []).append(i)
+    rf = np.zeros((len(kept), len(hypotheses)), dtype=np.int64)
+    nrf = np.zeros((len(kept), len(hypotheses)))
+    n_taxa = np.zeros(len(kept), dtype=np.int64)
+    for taxa, members in groups.items():
+        if len(taxa) < 4:
+            print(f"Warning: {len(members)} windows share fewer than 4 taxa with the hypotheses; they are always sent to the AU test.")
+            rf[members], nrf[members] = -1, 1.0
+            continue
+        rf[members], nrf[members] = screen_group([kept[i][1] for i in members], hypotheses, set(taxa))
+        n_taxa[members] = len(taxa)
+
+    closest = nrf.argmin(axis=1) + 1
+    needs_test = nrf[:, args.null_hypothesis - 1] > args.max_nrf
+
+    labels = [f"H{h}" for h in range(1, len(hypotheses) + 1)]
+    with open(args.output, "w") as out:
+        out.write("\t".join(["window", "n_taxa"] + [f"rf_{label}" for label in labels] + [f"nrf_{label}" for label in labels] + ["closest_hypothesis", "needs_au_test"]) + "\n")
+        for i, (window, _) in enumerate(kept):
+            out.write("\t".join(
+                [str(window), str(n_taxa[i])] + [str(value) for value in rf[i]] + [f"{value:.4f}" for value in nrf[i]] + [labels[closest[i] - 1], str(int(needs_test[i]))]
+            ) + "\n")
+    if args.test_list:
+        with open(args.test_list, "w") as out:
+            out.writelines(f"{window}\n" for (window, _), needed in zip(kept, needs_test) if needed)
+
+    print(f"Screened {len(kept)} windows against {len(hypotheses)} hypotheses: {int(needs_test.sum())} need an AU test, "
+          f"{len(kept) - int(needs_test.sum())} match H{args.null_hypothesis} (normalized RF <= {args.max_nrf}). Results saved to {args.output}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Robinson-Foulds pre-screen of sliding-window trees against the alternative topology hypotheses.")
+    parser.add_argument("--hypotheses", required=True, help="Treefile with the hypothesis trees, e.g. HRA_all_alternative_hypotheses.treefile.")
+    trees = parser.add_mutually_exclusive_group(required=True)
+    trees.add_argument("--trees", help="One window tree per line, e.g. iqtree-arborist's cleaned output.")
+    trees.add_argument("--merged_dir", help="Directory of treeFile_merger per-window files (the first tree in each is used).")
+    trees.add_argument("--store", help="treeFile_merger SQLite window store.")
+    parser.add_argument("--treefile_manifest", help="iqtree-arborist treefile manifest, to number --trees lines by window instead of by line.")
+    parser.add_argument("--merged_suffix", default=".tre", help="Suffix of the --merged_dir files (default: .tre).")
+    parser.add_argument("--null_hypothesis", type=int, default=1, help="Hypothesis (1-based, in file order) that windows are skipped for matching (default: 1).")
+    parser.add_argument("--max_nrf", type=float, default=0.0, help="Largest normalized RF to the null hypothesis that still counts as a match (default: 0, identical topology).")
+    parser.add_argument("--output", required=True, help="Output TSV of per-window RF distances.")
+    parser.add_argument("--test_list", help="Optional file listing the windows that still need an AU test, one per line.")
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,91 @@
+"""
+Script title: topology_dedup.py
+Author: Emmarie Alexander
+Contact: emmarie.alexander@tamu.edu
+Date written: 18-October-2026
+Date last updated: 18-October-2026
+Purpose: With 500 bp windows and a 50 bp step, neighbouring windows very often have the same tree topology, but every window is still sent to IQ-TREE's topology tests as if it were unique.
+This script reduces each window tree to its canonical unrooted topology (GHOST annotations, branch lengths and internal labels removed, rooting and child order normalized; see CompactTree.canonical_topology in compact_tree.py), hashes it, and groups windows by topology.
+It writes:
+    --unique_trees  - one canonical Newick per distinct topology, in order of first appearance (topology T1 is line 1, and so on), ready for IQ-TREE's -z
+    --window_map    - window -> topology id and hash
+    --summary       - per topology: number of windows, fraction of windows, number of runs of consecutive windows (distinct alignment blocks), and first/last window
+Window trees are read the same way as in rf_screen.py: --trees (plus arborist's --treefile_manifest for window numbers), --merged_dir or --store; for the merger's files, the first (unconstrained) tree is used.
+
+Example usage:
+python topology_dedup.py --trees DDX3YX_cleaned.tre --treefile_manifest DDX3YX_treefiles/treefile_manifest.tsv --unique_trees DDX3YX_unique_topologies.tre --window_map DDX3YX_window_topologies.tsv --summary DDX3YX_topology_summary.tsv
+"""
+
+import argparse
+import hashlib
+
+from compact_tree import parse_newick
+from rf_screen import read_window_trees
+
+
+def topology_hash(canonical_newick):
+    return hashlib.sha1(canonical_newick.encode()).hexdigest()[:16]
+
+
+def main(args):
+    windows, newicks = read_window_trees(args)
+
+    names, name_lookup = [], {}
+    topology_ids = {}  # Canonical Newick -> topology number, in order of first appearance
+    window_topologies = []
+    skipped = 0
+    for window, newick in zip(windows, newicks):
+        trees = parse_newick(newick, names, name_lookup) if newick else []
+        if not trees:
+            skipped += 1
+            continue
+        canonical = trees[0].canonical_topology()
+        topology_ids.setdefault(canonical, len(topology_ids) + 1)
+        window_topologies.append((window, topology_ids[canonical]))
+    if skipped:
+        print(f"Warning: {skipped} windows had no tree and were left out.")
+
+    canonical_by_id = {topology_id: canonical for canonical, topology_id in topology_ids.items()}
+    hashes = {topology_id: topology_hash(canonical) for topology_id, canonical in canonical_by_id.items()}
+
+    with open(args.unique_trees, "w") as out:
+        out.writelines(f"{canonical_by_id[topology_id]}\n" for topology_id in sorted(canonical_by_id))
+
+    with open(args.window_map, "w") as out:
+        out.write("window\ttopology\thash\n")
+        out.writelines(f"{window}\tT{topology_id}\t{hashes[topology_id]}\n" for window, topology_id in window_topologies)
+
+    if args.summary:
+        # One pass in window order: count windows and runs of consecutive windows per topology
+        stats = {topology_id: [0, 0, None, None] for topology_id in canonical_by_id}  # windows, runs, first, last
+        previous_window = previous_topology = None
+        for window, topology_id in window_topologies:
+            entry = stats[topology_id]
+            entry[0] += 1
+            if topology_id != previous_topology or previous_window is None or window != previous_window + 1:
+                entry[1] += 1
+            entry[2] = window if entry[2] is None else entry[2]
+            entry[3] = window
+            previous_window, previous_topology = window, topology_id
+        with open(args.summary, "w") as out:
+            out.write("topology\thash\tn_windows\tfraction\tn_runs\tfirst_window\tlast_window\tnewick\n")
+            for topology_id, (n_windows, n_runs, first, last) in sorted(stats.items(), key=lambda item: -item[1][0]):
+                out.write(f"T{topology_id}\t{hashes[topology_id]}\t{n_windows}\t{n_windows / len(window_topologies):.4f}\t{n_runs}\t{first}\t{last}\t{canonical_by_id[topology_id]}\n")
+
+    print(f"{len(window_topologies)} windows collapse to {len(topology_ids)} distinct topologies. Unique trees saved to {args.unique_trees} and the window map to {args.window_map}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Group sliding-window trees by canonical topology and write one tree per distinct topology.")
+    trees = parser.add_mutually_exclusive_group(required=True)
+    trees.add_argument("--trees", help="One window tree per line, e.g. iqtree-arborist's cleaned output.")
+    trees.add_argument("--merged_dir", help="Directory of treeFile_merger per-window files (the first tree in each is used).")
+    trees.add_argument("--store", help="treeFile_merger SQLite window store.")
+    parser.add_argument("--treefile_manifest", help="iqtree-arborist treefile manifest, to number --trees lines by window instead of by line.")
+    parser.add_argument("--merged_suffix", default=".tre", help="Suffix of the --merged_dir files (default: .tre).")
+    parser.add_argument("--unique_trees", required=True, help="Output file with one canonical tree per distinct topology.")
+    parser.add_argument("--window_map", required=True, help="Output TSV mapping each window to its topology.")
+    parser.add_argument("--summary", help="Optional TSV of per-topology window counts and frequencies.")
+
+    args = parser.parse_args()
+    main(args)
@@ -2,8 +2,10 @@
 Script title: treeFile_merger.py
 Author: Emmarie Alexander
 Date written: 1-April-2025
-Last updated: 1-April-2025
+Last updated: 18-October-2026
 
+Summary v3.2: The directories, suffixes, output prefix and log file are now arguments (the defaults are the old hardcoded values). Added '--store', which writes every window's pair of trees into one SQLite file keyed by window number instead of one small .tre file per window, and '--export_range', which writes any range of windows from the store back out as the per-window files IQ-TREE's -z needs.
+Summary v3.1: Added '--incremental'. The size, mtime and first line of every treefile are kept in a harvest manifest (harvest_manifest.py), so a rerun only reads new or changed treefiles and only rewrites the merged files whose pair of trees changed. Fixed the window number being read from a regex group that doesn't exist.
 Summary v3: Added prefix pairing as I noticed that previously, it was grouping incorrect files.
 Summary v2: Counts the number of tree files from both directories. Matches them. Changed the output directory name. Changed the output file names. Added file suffix. Unconstrained trees have ".fasta.treefile" as their extension while constrained trees have ".constr.treefile" as their extension.
 Summary v1: There appears to be differences in the number of treefiles in the unconstrained and constrained directories. I need to modify the script to count number of files and make sure they're the same.
@@ -16,58 +18,78 @@ Purpose: This script was written to merge the output of multiple IQTREE treefile
 # This script assumes that your trees are in GHOST format, such that each base had a rate parmater calculated and is stored in branches: [1/2/3/4]
 # I wrote this script for a gene conversion pipeline, where file one is the unconstrained tree search and file two is the constrained tree search.
 # I ran these tree searches in IQ-TREE2 using the GHOST model. I decided not to strip these parameters from the tree since they are informative in their own right for each parameter.
+#
+# Tens of thousands of two-line .tre files are hard on the cluster's filesystem, so with '--store' the pairs go into a single SQLite file instead:
+#   python treeFile_merger.v3.py --unconstrained_dir unconstrained/ --constrained_dir constrained/ --store DDX3YX_window_trees.sqlite
+# and only the windows being tested are written out as files when they're needed:
+#   python treeFile_merger.v3.py --store DDX3YX_window_trees.sqlite --export_range 1 500 --output_dir treesearches_1-500/
 
+import argparse
 import os
 import logging
+import re
+import sqlite3
+from contextlib import closing
+
+from harvest_manifest import load_manifest, save_manifest, split_changed
 
-def setup_logging():
+def setup_logging(log_file='Treefile_Merger_Euarchontoglires_DDX3YX.log'):
     logging.basicConfig(
-        filename='Treefile_Merger_Euarchontoglires_DDX3YX.log', # change to reflect what you're running this script on
+        filename=log_file, # change to reflect what you're running this script on
         level=logging.DEBUG,
         format='%(asctime)s - %(levelname)s - %(message)s',
         filemode='a')
     logging.info('Program started')
 
-import os
-import logging
-import re
-
-def extract_first_lines(directory, file_suffix, pairing_dict):
+def extract_first_lines(directory, file_suffix, pairing_dict, records=None):
     """
     Extracts the first lines from the treefiles 
     
     directory: Path to the folder containing treefiles.
     file_suffix: Expected suffix for this file type (e.g., '.fasta.treefile' or '.constr.treefile').
     pairing_dict: Dictionary to store first lines indexed by numerical prefix.
+    records: Optional harvest manifest section (filename -> [size, mtime_ns, first line]); only new or changed files are read.
     """
+    incremental = records is not None
+    records = {} if records is None else records
     try:
         filenames = sorted(f for f in os.listdir(directory) if f.endswith(file_suffix))
+        if incremental:
+            changed = split_changed([(filename, os.path.join(directory, filename)) for filename in filenames], records)
+        else:
+            # Every treefile is read anyway, so none of them are stat-ed
+            changed = [(filename, os.path.join(directory, filename), [None, None]) for filename in filenames]
+
+        for filename, filepath, signature in changed:
+            try:
+                with open(filepath, 'r') as file:
+                    records[filename] = signature + [file.readline().strip()]
+            except Exception as e:
+                logging.error(f"Error reading {filename}: {e}")
+        if incremental:
+            logging.info(f"{len(changed)} new or changed treefiles read from {directory} ({len(filenames) - len(changed)} unchanged).")
 
         for filename in filenames:
             match = re.match(r"(\d+)\..*", filename)  # Extract numeric prefix
             if not match:
                 logging.warning(f"Skipping {filename}: Cannot determine prefix.")
                 continue
-            
-            file_prefix = int(match.group(2))  # Convert extracted number to integer
-            filepath = os.path.join(directory, filename)
+            if filename not in records:
+                continue  # Couldn't be read (logged above)
 
-            try:
-                with open(filepath, 'r') as file:
-                    first_line = file.readline().strip()
+            file_prefix = int(match.group(1))  # Convert extracted number to integer
+            first_line = records[filename][2]
 
-                    if not first_line:
-                        logging.warning(f"{filename} in {directory} is empty.")
-                        continue
-                    
-                    pairing_dict[file_prefix] = first_line  # Store first line with numeric key
-            except Exception as e:
-                logging.error(f"Error reading {filename}: {e}")
+            if not first_line:
+                logging.warning(f"{filename} in {directory} is empty.")
+                continue
+
+            pairing_dict[file_prefix] = first_line  # Store first line with numeric key
 
     except Exception as e:
         logging.error(f"Error processing files in {directory}: {e}")
 
-def merge_lines(unconstrained_dict, constrained_dict, output_directory):
+def merge_lines(unconstrained_dict, constrained_dict, output_directory, merged_records=None, output_prefix="Euarchontoglires_treesearch"):
     """
     Merges first lines based on numerical prefixes and saves these to an output file.
     The unconstrained tree is the first line (top tree), constrained is the second line (bottom tree).
@@ -75,11 +97,17 @@ def merge_lines(unconstrained_dict, constrained_dict, output_directory):
     unconstrained_dict: First lines from unconstrained files (keyed by prefix).
     constrained_dict: First lines from constrained files (keyed by prefix).
     output_directory: Directory to save merged files.
+    merged_records: Optional harvest manifest section (prefix -> [unconstrained, constrained]); windows whose pair is unchanged and already written are skipped.
+    output_prefix: Merged files are named {output_prefix}_{prefix}.tre.
     """
     os.makedirs(output_directory, exist_ok=True)
+    merged_records = {} if merged_records is None else merged_records
     
     for key in sorted(unconstrained_dict.keys() & constrained_dict.keys()):  # Ensure matching keys
-        output_filepath = os.path.join(output_directory, f"Euarchontoglires_treesearch_{key}.tre")
+        output_filepath = os.path.join(output_directory, f"{output_prefix}_{key}.tre")
+        pair = [unconstrained_dict[key], constrained_dict[key]]
+        if merged_records.get(str(key)) == pair and os.path.exists(output_filepath):
+            continue
 
         logging.info(f"Merging files with prefix {key}: {unconstrained_dict[key]} + {constrained_dict[key]}")
 
@@ -87,28 +115,99 @@ def merge_lines(unconstrained_dict, constrained_dict, output_directory):
             with open(output_filepath, "w") as output_file:
                 output_file.write(unconstrained_dict[key] + "\n")
                 output_file.write(constrained_dict[key] + "\n")
+            merged_records[str(key)] = pair
         except Exception as e:
             logging.error(f"Error writing {output_filepath}: {e}")
 
-def main():
-    setup_logging()
-    
-    unconstrained_dir = "./Euarchontoglires_DDX3YX_unconstrained/" # change path
-    constrained_dir = "./Euarchontoglires_DDX3YX_constrained/" # change path
-    merged_output_dir = "./Euarchontoglires_DDX3YX_treesearches" # change path
+def open_store(store_path):
+    """Opens (or creates) the window tree store: one row per window with its unconstrained and constrained tree."""
+    conn = sqlite3.connect(store_path)
+    conn.execute("CREATE TABLE IF NOT EXISTS window_trees (window INTEGER PRIMARY KEY, unconstrained TEXT NOT NULL, constrained TEXT NOT NULL)")
+    return conn
+
+def store_lines(unconstrained_dict, constrained_dict, store_path):
+    """
+    Writes every matching pair of first lines into the store in one transaction; a window that is already there is replaced.
+    Returns the number of windows stored.
+    """
+    keys = sorted(unconstrained_dict.keys() & constrained_dict.keys())
+    with closing(open_store(store_path)) as conn, conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO window_trees (window, unconstrained, constrained) VALUES (?, ?, ?)",
+            ((key, unconstrained_dict[key], constrained_dict[key]) for key in keys))
+    logging.info(f"Stored {len(keys)} windows in {store_path}")
+    return len(keys)
+
+def read_window(store_path, window):
+    """Returns the (unconstrained, constrained) trees for one window, or None if the window isn't in the store."""
+    with closing(open_store(store_path)) as conn:
+        return conn.execute("SELECT unconstrained, constrained FROM window_trees WHERE window = ?", (window,)).fetchone()
+
+def export_windows(store_path, output_directory, first_window=None, last_window=None, output_prefix="Euarchontoglires_treesearch"):
+    """
+    Writes the windows between first_window and last_window (inclusive; None means no limit) from the store as the usual two-line {output_prefix}_{window}.tre files.
+    Returns the number of files written.
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    first_window = float('-inf') if first_window is None else first_window
+    last_window = float('inf') if last_window is None else last_window
+    n_written = 0
+    with closing(open_store(store_path)) as conn:
+        rows = conn.execute("SELECT window, unconstrained, constrained FROM window_trees WHERE window BETWEEN ? AND ? ORDER BY window", (first_window, last_window))
+        for window, unconstrained, constrained in rows:
+            with open(os.path.join(output_directory, f"{output_prefix}_{window}.tre"), "w") as output_file:
+                output_file.write(unconstrained + "\n")
+                output_file.write(constrained + "\n")
+            n_written += 1
+    logging.info(f"Exported {n_written} windows from {store_path} to {output_directory}")
+    return n_written
+
+def main(args):
+    setup_logging(args.log_file)
+
+    if args.export_range:
+        export_windows(args.store, args.output_dir, *args.export_range, output_prefix=args.output_prefix)
+        logging.info('Script has finished successfully!')
+        return
     
     unconstrained_dict = {}
     constrained_dict = {}
 
-    extract_first_lines(unconstrained_dir, ".fasta.treefile", unconstrained_dict)
-    extract_first_lines(constrained_dir, ".constr.treefile", constrained_dict)
+    # With --incremental, what was read and written last time is kept in the harvest manifest
+    manifest_dir = os.path.dirname(os.path.abspath(args.store)) if args.store else args.output_dir
+    harvest_manifest = (args.harvest_manifest or os.path.join(manifest_dir, "treeFile_merger.harvest.json")) if args.incremental else None
+    manifest = load_manifest(harvest_manifest) if harvest_manifest else None
+
+    extract_first_lines(args.unconstrained_dir, args.unconstrained_suffix, unconstrained_dict, manifest.setdefault("unconstrained", {}) if manifest is not None else None)
+    extract_first_lines(args.constrained_dir, args.constrained_suffix, constrained_dict, manifest.setdefault("constrained", {}) if manifest is not None else None)
     
     if set(unconstrained_dict.keys()) != set(constrained_dict.keys()):
         logging.warning("Mismatch in file prefixes between unconstrained and constrained files.")
 
-    merge_lines(unconstrained_dict, constrained_dict, merged_output_dir)
+    if args.store:
+        store_lines(unconstrained_dict, constrained_dict, args.store)
+    else:
+        merge_lines(unconstrained_dict, constrained_dict, args.output_dir, manifest.setdefault("merged", {}) if manifest is not None else None, args.output_prefix)
+    if harvest_manifest:
+        save_manifest(harvest_manifest, manifest)
     
     logging.info('Script has finished successfully!')
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Pair the unconstrained and constrained treefile of each window into one two-tree file.")
+    parser.add_argument("--unconstrained_dir", default="./Euarchontoglires_DDX3YX_unconstrained/", help="Directory of unconstrained tree search treefiles.")
+    parser.add_argument("--constrained_dir", default="./Euarchontoglires_DDX3YX_constrained/", help="Directory of constrained tree search treefiles.")
+    parser.add_argument("--unconstrained_suffix", default=".fasta.treefile", help="Suffix of the unconstrained treefiles (default: .fasta.treefile).")
+    parser.add_argument("--constrained_suffix", default=".constr.treefile", help="Suffix of the constrained treefiles (default: .constr.treefile).")
+    parser.add_argument("--output_dir", default="./Euarchontoglires_DDX3YX_treesearches", help="Directory for the merged per-window .tre files.")
+    parser.add_argument("--output_prefix", default="Euarchontoglires_treesearch", help="Merged files are named <output_prefix>_<window>.tre (default: Euarchontoglires_treesearch).")
+    parser.add_argument("--log_file", default="Treefile_Merger_Euarchontoglires_DDX3YX.log", help="Log file (appended to).")
+    parser.add_argument("--store", help="SQLite file to store every window's pair of trees in, instead of writing one .tre file per window.")
+    parser.add_argument("--export_range", nargs=2, type=int, metavar=("FIRST", "LAST"), help="Write windows FIRST to LAST (inclusive) from --store to --output_dir as per-window .tre files, then exit.")
+    parser.add_argument("--incremental", action="store_true", help="Only read treefiles that are new or changed since the last run, and only rewrite windows whose trees changed.")
+    parser.add_argument("--harvest_manifest", help="Harvest manifest used by --incremental (default: treeFile_merger.harvest.json in the merged output directory).")
+
+    args = parser.parse_args()
+    if args.export_range and not args.store:
+        parser.error("--export_range needs --store.")
+    main(args)
@@ -3,70 +3,62 @@ Script title: tree_concatenator.py
 Author: Emmarie Alexander
 Contact: emmarie.alexander@tamu.edu
 Date written: 05-February-2025
-Date last updated: 5-May-2025
+Date last updated: 18-Oct-2026
+Summary v2.2: Now a CLI. A manifest of (tree_1, tree_2, species_list, output) rows can be run in one go across a process pool; each species list is read once per worker, the first time a pair needs it, and a failure on one pair (including a missing species list) is reported in the batch report instead of stopping the batch.
+Summary v2.1: Trees are read, made ultrametric, merged, pruned and written with the array-based CompactTree in compact_tree.py (which can also cache parsed files, see --cache) instead of ete3 objects. Internal nodes are written without labels.
 Summary v2: Adjusted the script so that the script is less confusing and uses genes instead of gametologs, making it more versatile.
 Purpose: The purpose of this script is to concatenate two trees (in the case of this script's utilization, the assumed species tree for mammals).
 
+Example usage:
+Single pair:
+python tree_concatenator.v2.py --tree_1 DDX3Y.tre --tree_2 DDX3X.tre --species_list species.txt --output DDX3YX_merged_pruned.tre
+Batch (TSV manifest with tree_1, tree_2, species_list and output columns; a header row is optional):
+python tree_concatenator.v2.py --manifest window_pairs.tsv --threads 8 --report tree_concatenator_report.tsv
+
 Resources:
 https://evomics.org/wp-content/uploads/2019/01/ete_tutorial.pdf
 """
-#### PART ONE - CREATING A TOY PHYLOGENY ####
-from ete3 import Tree
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
-def read_gene_tree(filename):
-    with open(filename, 'r') as file:
-        newick_tree = file.read()
+from compact_tree import load_tree, merge_trees
+
+USE_CACHE = False
+SPECIES_LISTS = {}  # Species list path -> species set, loaded by each worker the first time a pair needs it
 
-    tree = Tree(newick_tree) # Converts to a readable ete3
-    tree.convert_to_ultrametric(tree_length=None, strategy='balanced') # Makes the tree ultrametric
+#### PART ONE - CREATING A TOY PHYLOGENY ####
+def read_gene_tree(filename):
+    tree = load_tree(filename, use_cache=USE_CACHE) # Reads the first tree into a CompactTree (cached after the first read with --cache)
+    tree.convert_to_ultrametric(tree_length=None) # Makes the tree ultrametric (same as ete3's 'balanced' strategy)
     return tree # Returns tree object
 
 # creates a new root and concatenates both trees together
 def create_merged_tree(tree_1, tree_2, output_file=None):
-    new_root = Tree()
-    new_root.add_child(tree_1)
-    new_root.add_child(tree_2)
+    new_root = merge_trees([tree_1, tree_2])
 
     # Converts the newly constructed tree into a rooted, ultrametric (or "cladogram" tree)
-    new_root.convert_to_ultrametric(tree_length=None, strategy='balanced')
+    new_root.convert_to_ultrametric(tree_length=None)
 
     # Writes the new tree as an output file if output file name is specified
     if output_file:
         with open(output_file, 'w') as file:
-            file.write(new_root.write(format=1)) # Print the merged tree in Newick format
+            file.write(new_root.to_newick(internal_names=False)) # Print the merged tree in Newick format
 
     return new_root # Returns the merged tree
 
-# Initial tree
-t1_gene_tree = ".tre" # input tree one
-t2_gene_tree = ".tre" # input tree two
-
-# Read in newick trees from file
-tree_1 = read_gene_tree(t1_gene_tree)
-tree_2 = read_gene_tree(t2_gene_tree)
-
-output_file = ".tre" # output file, you'll use this in the next step
-
-merged_tree = create_merged_tree(tree_1, tree_2, output_file)
-print(merged_tree)
-
-######################## STEP TWO - PRUNE SPECIES TIPS ######################## 
+######################## STEP TWO - PRUNE SPECIES TIPS ########################
 # Load the species list from a text file
 def load_species_list(filename):
     with open(filename, 'r') as file:
         species = {line.strip() for line in file}
     return species
-   
-# Prune tree to retain only the species specified in the list
-def prune_tree(tree_file, species_list, final_output_tree=None):
-    # Load species names
-    species_staying_in_tree = load_species_list(species_list)
-
-    # Load tree
-    tree = Tree(tree_file, format=1)
 
+# Prune an already-loaded tree to retain only the species specified in the list
+def prune_merged_tree(tree, species_staying_in_tree, final_output_tree=None):
     # Gets names of all of the leaves and ignore any leaves or nodes without names
-    named_leaves = {leaf.name for leaf in tree.get_leaves() if leaf.name is not None}
+    named_leaves = {name for name in tree.leaf_names() if name}
 
     # Determines whether the sppecies list and species tree match up
     species_staying_in_tree = species_staying_in_tree.intersection(named_leaves)
@@ -74,19 +66,90 @@ def prune_tree(tree_file, species_list, final_output_tree=None):
     if not species_staying_in_tree:
         raise ValueError("No matching species found in the tree!")
 
-    # Removes species (or tips) that are not found in the species list
-    tree.prune(species_staying_in_tree, preserve_branch_length=True)
+    # Removes species (or tips) that are not found in the species list, preserving branch lengths
+    tree = tree.prune(species_staying_in_tree)
 
     # Save pruned tree
     if final_output_tree:
-        tree.write(outfile=final_output_tree)
+        with open(final_output_tree, 'w') as file:
+            file.write(tree.to_newick(internal_names=False))
 
     return tree
 
-# input files
-species_list = ".txt" # path to a text file containing a list of what species you want in your final tree
-tree_file = ".tre" # path to the input tree
-final_output_tree = ".tre" # path to what you want your final output tree to be
-
-pruned_tree = prune_tree(tree_file, species_list, final_output_tree)
-print(pruned_tree)
+# Prune tree to retain only the species specified in the list
+def prune_tree(tree_file, species_list, final_output_tree=None):
+    return prune_merged_tree(load_tree(tree_file, use_cache=USE_CACHE), load_species_list(species_list), final_output_tree)
+
+######################## BATCH MODE ########################
+def set_worker_state(use_cache):
+    global USE_CACHE
+    USE_CACHE = use_cache
+
+def get_species_list(path):
+    if path not in SPECIES_LISTS:
+        SPECIES_LISTS[path] = frozenset(load_species_list(path))
+    return SPECIES_LISTS[path]
+
+# Runs the whole pipeline for one pair; errors are returned rather than raised so one bad pair doesn't stop the batch
+def run_pair(tree_1_file, tree_2_file, species_list, output_file, merged_output=None):
+    try:
+        merged_tree = create_merged_tree(read_gene_tree(tree_1_file), read_gene_tree(tree_2_file), merged_output)
+        pruned_tree = prune_merged_tree(merged_tree, get_species_list(species_list), output_file)
+        return output_file, "ok", f"{len(pruned_tree.leaves())} species"
+    except Exception as e:
+        return output_file, "failed", f"{type(e).__name__}: {e}"
+
+def read_manifest(manifest_file):
+    with open(manifest_file, 'r') as file:
+        rows = [line.rstrip("\n").split("\t") for line in file if line.strip() and not line.startswith("#")]
+    if rows and rows[0][0] == "tree_1":  # Skip the header row
+        rows = rows[1:]
+    bad_rows = [i + 1 for i, row in enumerate(rows) if len(row) < 4]
+    if bad_rows:
+        raise ValueError(f"Manifest rows need tree_1, tree_2, species_list and output columns (check rows {bad_rows[:5]}).")
+    return [tuple(row[:4]) for row in rows]
+
+def main(args):
+    if args.manifest:
+        jobs = read_manifest(args.manifest)
+    else:
+        jobs = [(args.tree_1, args.tree_2, args.species_list, args.output)]
+
+    use_cache = args.cache
+
+    if len(jobs) == 1:
+        set_worker_state(use_cache)
+        results = [run_pair(*jobs[0], args.merged_output)]
+    else:
+        pool_options = {}
+        if sys.version_info >= (3, 11):
+            # Workers are recycled every few hundred pairs so memory stays bounded over long batches (needs Python 3.11+)
+            pool_options["max_tasks_per_child"] = 500
+        with ProcessPoolExecutor(max_workers=args.threads, initializer=set_worker_state, initargs=(use_cache,), **pool_options) as pool:
+            results = list(pool.map(run_pair, *zip(*jobs), chunksize=16))
+
+    failed = [result for result in results if result[1] != "ok"]
+    with open(args.report, 'w') as report:
+        report.write("output\tstatus\tdetail\n")
+        for result in results:
+            report.write("\t".join(result) + "\n")
+    for output_file, _, detail in failed:
+        print(f"Failed: {output_file} ({detail})")
+    print(f"Finished {len(results)} tree pairs: {len(results) - len(failed)} succeeded, {len(failed)} failed. Report saved to {args.report}.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge two gene trees under a new root, make them ultrametric and prune them to a species list.")
+    parser.add_argument("--tree_1", help="First input tree (e.g. the Y gametolog gene tree).")
+    parser.add_argument("--tree_2", help="Second input tree (e.g. the X gametolog gene tree).")
+    parser.add_argument("--species_list", help="Text file of species to keep in the final tree, one per line.")
+    parser.add_argument("--output", help="Path to the final merged and pruned tree.")
+    parser.add_argument("--merged_output", help="Optional path to also save the merged tree before pruning (single pair only).")
+    parser.add_argument("--manifest", help="TSV of tree_1, tree_2, species_list, output rows to run as a batch.")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="Number of tree pairs to process in parallel (default: all cores).")
+    parser.add_argument("--report", default="tree_concatenator_report.tsv", help="Per-pair status report (default: tree_concatenator_report.tsv).")
+    parser.add_argument("--cache", action="store_true", help="Read and write the binary tree cache (worth it for large trees reused across runs, not for one-off window trees).")
+
+    args = parser.parse_args()
+    if not args.manifest and not all([args.tree_1, args.tree_2, args.species_list, args.output]):
+        parser.error("Give either --manifest, or all of --tree_1, --tree_2, --species_list and --output.")
+    main(args)
@@ -0,0 +1,178 @@
+"""
+Script title: window_slicer.py
+Author: Emmarie Alexander
+Contact: emmarie.alexander@tamu.edu
+Date written: 18-October-2026
+Date last updated: 18-October-2026
+Purpose: A pure-Python alternative to the windowing step of automated-window-sliding (automated_window_sliding_template.slurm), which writes every 500 bp / 50 bp-step window to its own alignment file before IQ-TREE runs.
+The alignment is memory-mapped once. If every sequence is on one line (unwrapped FASTA), each window is a set of zero-copy views into the mapped file; wrapped FASTAs are read into one species x sites array first.
+Missing data per window (gaps, N and ?) is worked out from running totals built one species and one column chunk at a time, keeping only the totals at window edges, so screening needs memory for one chunk plus a few numbers per window rather than a copy of the alignment. Windows above '--max_missing' (overall) or with any species above '--max_species_missing' are skipped.
+Only the windows that pass, and that are in '--window_list' if one is given (e.g. rf_screen.py's --test_list), are written, in shard directories of '--shard_size' windows, so nothing is written for windows that are never run.
+Window n covers alignment columns (n - 1) * step_size + 1 to (n - 1) * step_size + window_size, the numbering used by window_track_exporter.py and phyloP_FASTA_annotator.py. Only full-length windows are made.
+Windows are written as <window>.fasta, so IQ-TREE's <window>.fasta.treefile outputs carry the window number that both iqtree-arborist.v2.py and treeFile_merger.v3.py sort and pair on; an '--index' TSV records every window's columns, missing fraction, status and file.
+
+Example usage:
+python window_slicer.py --alignment DDX3YX_aligned.fasta --output_dir DDX3YX_windows --window_size 500 --step_size 50 --max_missing 0.5 --shard_size 1000 --index DDX3YX_windows.tsv
+"""
+
+import argparse
+import mmap
+import os
+
+import numpy as np
+
+MISSING = np.zeros(256, dtype=bool)
+MISSING[[ord(c) for c in "-Nn?"]] = True
+CHUNK_COLUMNS = 1 << 22  # Columns per running-total chunk when screening windows
+
+
+class MappedAlignment:
+    """A FASTA alignment opened once: species names and one uint8 row per species (views into the mapped file when possible)."""
+
+    def __init__(self, fasta_file):
+        self._file = open(fasta_file, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = np.frombuffer(self._map, dtype=np.uint8)
+        self.names, self.rows = [], []
+        single_line = True
+        offset = 0
+        spans = []  # (name, first sequence byte, end of the sequence's last line)
+        end_of_file = len(self._map) - 1 if self._map[-1:] == b"\n" else len(self._map)
+        while offset < end_of_file:
+            header_end = self._map.find(b"\n", offset)
+            next_header = self._map.find(b"\n>", header_end)
+            record_end = next_header if next_header >= 0 else end_of_file
+            spans.append((self._map[offset + 1:header_end].split()[0].decode(), header_end + 1, record_end))
+            single_line = single_line and self._map.find(b"\n", header_end + 1, record_end) < 0
+            offset = record_end + 1
+
+        for name, start, end in spans:
+            self.names.append(name)
+            if single_line:
+                row = buffer[start:end]
+                self.rows.append(row[:-1] if len(row) and row[-1] == ord("\r") else row)
+            else:
+                # Wrapped sequences aren't contiguous in the file, so they are copied into plain arrays once
+                self.rows.append(np.frombuffer(self._map[start:end].replace(b"\n", b"").replace(b"\r", b""), dtype=np.uint8))
+        self.zero_copy = single_line
+
+        lengths = {len(row) for row in self.rows}
+        if len(lengths) != 1:
+            raise ValueError(f"{fasta_file}: sequences have different lengths ({sorted(lengths)[:5]}); is it aligned?")
+        self.length = lengths.pop()
+
+    def window_missing(self, starts, window_size, chunk_size=CHUNK_COLUMNS):
+        """
+        Missing characters in each window starting at `starts`: (total over all species, most in any one species).
+        Each species' running total is built one column chunk at a time and only read at the window edges.
+        """
+        edges = np.union1d(starts, starts + window_size)  # Sorted positions whose running totals are needed
+        first, last = np.searchsorted(edges, starts), np.searchsorted(edges, starts + window_size)
+        total = np.zeros(len(starts), dtype=np.int64)
+        worst = np.zeros(len(starts), dtype=np.int64)
+        at_edges = np.zeros(len(edges), dtype=np.int64)  # Missing characters before each edge, for the current species
+        for row in self.rows:
+            carry = 0
+            for chunk_start in range(0, self.length, chunk_size):
+                running = np.cumsum(MISSING[row[chunk_start:chunk_start + chunk_size]], dtype=np.int64)
+                running += carry
+                # Edges in (chunk_start, chunk_end] are covered by this chunk; edge p is the total of row[:p]
+                lo, hi = np.searchsorted(edges, [chunk_start, chunk_start + len(running)], side="right")
+                at_edges[lo:hi] = running[edges[lo:hi] - chunk_start - 1]
+                carry = int(running[-1])
+            counts = at_edges[last] - at_edges[first]
+            total += counts
+            np.maximum(worst, counts, out=worst)
+        return total, worst
+
+    def close(self):
+        self.rows = []
+        self._map.close()
+        self._file.close()
+
+
+def positive_int(value):
+    """argparse type for window, step and shard sizes, which must be at least 1."""
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
+
+def iter_windows(alignment, window_size, step_size, max_missing=1.0, max_species_missing=1.0):
+    """Yield (window, start column (0-based), missing fraction, passed) for every full-length window."""
+    if window_size <= 0 or step_size <= 0:
+        raise ValueError(f"Window and step sizes must be positive (got {window_size} and {step_size}).")
+    n_windows = (alignment.length - window_size) // step_size + 1 if alignment.length >= window_size else 0
+    starts = np.arange(n_windows, dtype=np.int64) * step_size
+    total, worst = alignment.window_missing(starts, window_size)
+    overall_missing = total / (window_size * len(alignment.rows))
+    passed = (overall_missing <= max_missing) & (worst / window_size <= max_species_missing)
+    for i in range(n_windows):
+        yield i + 1, int(starts[i]), float(overall_missing[i]), bool(passed[i])
+
+
+def write_window(path, alignment, start, window_size):
+    with open(path, "wb") as out:
+        for name, row in zip(alignment.names, alignment.rows):
+            out.write(f">{name}\n".encode())
+            out.write(row[start:start + window_size].tobytes() + b"\n")
+
+
+def read_window_list(window_list):
+    with open(window_list, "r") as f:
+        return {int(line.split()[0]) for line in f if line.strip() and line.split()[0].isdigit()}
+
+
+def main(args):
+    alignment = MappedAlignment(args.alignment)
+    print(f"{args.alignment}: {len(alignment.names)} species x {alignment.length} columns ({'zero-copy views' if alignment.zero_copy else 'wrapped FASTA, read into memory'}).")
+    selected = read_window_list(args.window_list) if args.window_list else None
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    n_written = n_skipped = n_total = 0
+    index = open(args.index, "w") if args.index else None
+    try:
+        if index:
+            index.write("window\tstart\tend\tmissing_fraction\tstatus\tfile\n")
+        for window, start, missing, passed in iter_windows(alignment, args.window_size, args.step_size, args.max_missing, args.max_species_missing):
+            n_total += 1
+            path = ""
+            if selected is not None and window not in selected:
+                status = "not_selected"
+            elif not passed:
+                status = "too_much_missing"
+                n_skipped += 1
+            else:
+                # Windows are written into shards of shard_size files, created only when the first window in them is written
+                shard_dir = os.path.join(args.output_dir, f"shard_{n_written // args.shard_size:04d}")
+                if n_written % args.shard_size == 0:
+                    os.makedirs(shard_dir, exist_ok=True)
+                path = os.path.join(shard_dir, f"{window}.fasta")
+                write_window(path, alignment, start, args.window_size)
+                status = "written"
+                n_written += 1
+            if index:
+                index.write(f"{window}\t{start + 1}\t{start + args.window_size}\t{missing:.4f}\t{status}\t{path}\n")
+    finally:
+        if index:
+            index.close()
+        alignment.close()
+
+    print(f"{n_total} windows of {args.window_size} bp (step {args.step_size}): {n_written} written to {args.output_dir}, {n_skipped} skipped for missing data.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Slice a FASTA alignment into sliding windows, writing only the windows that pass the missing-data filters.")
+    parser.add_argument("--alignment", required=True, help="Input FASTA alignment (uncompressed; unwrapped sequences allow zero-copy windows).")
+    parser.add_argument("--output_dir", required=True, help="Directory for the window shards.")
+    parser.add_argument("--window_size", type=positive_int, default=500, help="Window size in columns (default: 500).")
+    parser.add_argument("--step_size", type=positive_int, default=50, help="Step between window starts (default: 50).")
+    parser.add_argument("--max_missing", type=float, default=1.0, help="Skip windows whose overall fraction of gaps/N/? is above this (default: 1.0, keep all).")
+    parser.add_argument("--max_species_missing", type=float, default=1.0, help="Skip windows where any one species has more than this fraction missing (default: 1.0, keep all).")
+    parser.add_argument("--window_list", help="Optional file of window numbers (one per line) to write; all other windows are left out.")
+    parser.add_argument("--shard_size", type=positive_int, default=1000, help="Windows per shard directory (default: 1000).")
+    parser.add_argument("--index", help="Optional TSV listing every window's columns, missing fraction, status and file.")
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,158 @@
+"""
+Script title: window_track_exporter.py
+Author: Emmarie Alexander
+Contact: emmarie.alexander@tamu.edu
+Date written: 18-October-2026
+Date last updated: 18-October-2026
+Purpose: Turn the per-window topology test results from topologyTest_resultsMiner (one TSV row per window and tree) into genome browser tracks, so gene conversion tracts can be loaded straight into IGV/UCSC.
+Windows are numbered the same way as everywhere else in the pipeline: window n covers alignment columns (n - first_window) * step_size + 1 to that + window_size - 1, using the window size and step from automated_window_sliding_template.slurm (500 and 50).
+As in phyloP_FASTA_annotator's bedGraph output, each window is drawn over its central step-wide slice so neighbouring windows don't overlap.
+Alignment columns become reference coordinates either by adding '--ref_start' or through a column map such as the one gap_remover_phyloP.py writes with '--coords_file'.
+Two tracks are written, each in a single pass over the windows in order, merging runs of adjacent windows that share a value into one interval:
+    <prefix>_pAU.bedGraph         - p-AU of '--tree' (by default tree 2, the alternative hypothesis) in each window
+    <prefix>_best_hypothesis.bed  - the best-supported tree (highest logL) in each window, named tree<n>; the score is the number of windows merged
+
+Example usage:
+python window_track_exporter.py --results DDX3YX_topology_tests.tsv --chrom chrY --ref_start 12904108 --output_prefix DDX3YX
+python window_track_exporter.py --results DDX3YX_topology_tests.tsv --chrom chrY --column_map DDX3YX_coords.tsv --map_column Homo_sapiens --output_prefix DDX3YX
+"""
+
+import argparse
+import csv
+
+import numpy as np
+
+
+def read_results(results_file, tree):
+    """
+    Read the miner's TSV into window -> (best tree, p-AU of the chosen tree).
+    The best tree is the one with the highest logL; p-AU is None if the test wasn't run or the tree is missing.
+    """
+    windows = {}
+    with open(results_file, "r", newline="") as f:
+        for row in csv.DictReader(f, delimiter="\t"):
+            if row["window"] == "NA":
+                continue
+            window = int(row["window"])
+            best_tree, best_logL, p_au = windows.get(window, (None, float("-inf"), None))
+            logL = float(row["logL"])
+            if logL > best_logL:
+                best_tree, best_logL = int(row["tree"]), logL
+            if int(row["tree"]) == tree and row.get("p-AU", "NA") != "NA":
+                p_au = float(row["p-AU"])
+            windows[window] = (best_tree, best_logL, p_au)
+    return {window: (best_tree, p_au) for window, (best_tree, _, p_au) in sorted(windows.items())}
+
+
+def read_column_map(column_map, map_column):
+    """
+    Read a column map into an array of 1-based reference positions indexed by 1-based alignment column (-1 where the reference has no base).
+    The first column of the map is the alignment column; map_column names the column to take positions from (default: the third, as in gap_remover_phyloP's map).
+    """
+    with open(column_map, "r", newline="") as f:
+        reader = csv.reader(f, delimiter="\t")
+        header = next(reader)
+        position_index = header.index(map_column) if map_column else 2
+        rows = [(int(row[0]), row[position_index]) for row in reader if row]
+    positions = np.full(max(column for column, _ in rows) + 1, -1, dtype=np.int64)
+    for column, position in rows:
+        positions[column] = int(position) if position != "NA" else -1
+    return positions
+
+
+class CoordinateMapper:
+    """Converts a 1-based, inclusive alignment column range into a 0-based, half-open reference interval."""
+
+    def __init__(self, ref_start=1, positions=None):
+        self.ref_start = ref_start
+        self.positions = positions
+
+    def interval(self, first_column, last_column):
+        if self.positions is None:
+            return first_column + self.ref_start - 2, last_column + self.ref_start - 1
+        # Reference-gap columns have no position; use the outermost columns in the range that do
+        mapped = self.positions[first_column:min(last_column, len(self.positions) - 1) + 1]
+        mapped = mapped[mapped >= 0]
+        if not len(mapped):
+            return None
+        return int(mapped.min()) + self.ref_start - 2, int(mapped.max()) + self.ref_start - 1
+
+
+def window_slices(windows, window_size, step_size, first_window):
+    """Yield (window, first column, last column) of each window's central step-wide slice (1-based, inclusive)."""
+    offset = (window_size - step_size) // 2 if step_size < window_size else 0
+    width = min(step_size, window_size)
+    for window in windows:
+        first_column = (window - first_window) * step_size + offset + 1
+        yield window, first_column, first_column + width - 1
+
+
+def merged_runs(windows, values, window_size, step_size, first_window):
+    """
+    Single pass over the windows (in order) merging consecutive windows with the same value.
+    Yields (first column, last column, value, number of windows) for each run; a missing window number ends a run.
+    """
+    run = None
+    for (window, first_column, last_column), value in zip(window_slices(windows, window_size, step_size, first_window), values):
+        if run and value == run[2] and window == run[4] + 1:
+            run = (run[0], last_column, value, run[3] + 1, window)
+            continue
+        if run and run[2] is not None:
+            yield run[:4]
+        run = (first_column, last_column, value, 1, window)
+    if run and run[2] is not None:
+        yield run[:4]
+
+
+def write_tracks(windows, args, mapper):
+    window_numbers = list(windows)
+    best_trees = [windows[window][0] for window in window_numbers]
+    p_aus = [windows[window][1] for window in window_numbers]
+
+    pau_file = f"{args.output_prefix}_pAU.bedGraph"
+    n_intervals = 0
+    with open(pau_file, "w") as out:
+        out.write(f'track type=bedGraph name="{args.output_prefix}_pAU" description="p-AU of tree {args.tree} per {args.window_size} bp window"\n')
+        for first_column, last_column, p_au, _ in merged_runs(window_numbers, p_aus, args.window_size, args.step_size, args.first_window):
+            interval = mapper.interval(first_column, last_column)
+            if interval:
+                out.write(f"{args.chrom}\t{interval[0]}\t{interval[1]}\t{p_au:g}\n")
+                n_intervals += 1
+    print(f"Wrote {n_intervals} p-AU intervals to {pau_file}.")
+
+    best_file = f"{args.output_prefix}_best_hypothesis.bed"
+    n_intervals = 0
+    with open(best_file, "w") as out:
+        out.write(f'track name="{args.output_prefix}_best_hypothesis" description="Best-supported tree per {args.window_size} bp window"\n')
+        for first_column, last_column, best_tree, n_windows in merged_runs(window_numbers, best_trees, args.window_size, args.step_size, args.first_window):
+            interval = mapper.interval(first_column, last_column)
+            if interval:
+                out.write(f"{args.chrom}\t{interval[0]}\t{interval[1]}\ttree{best_tree}\t{min(n_windows, 1000)}\n")
+                n_intervals += 1
+    print(f"Wrote {n_intervals} best-hypothesis intervals to {best_file}.")
+
+
+def main(args):
+    windows = read_results(args.results, args.tree)
+    if not windows:
+        print(f"No windows were found in {args.results}.")
+        return
+    positions = read_column_map(args.column_map, args.map_column) if args.column_map else None
+    write_tracks(windows, args, CoordinateMapper(args.ref_start, positions))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export per-window topology test results as BED/bedGraph tracks in reference coordinates.")
+    parser.add_argument("--results", required=True, help="TSV written by topologyTest_resultsMiner (window, file, tree, logL, ..., p-AU).")
+    parser.add_argument("--output_prefix", required=True, help="Prefix for the output tracks.")
+    parser.add_argument("--chrom", default="alignment", help="Chromosome name for the tracks (default: alignment).")
+    parser.add_argument("--window_size", type=int, default=500, help="Sliding window size used for the analysis (default: 500).")
+    parser.add_argument("--step_size", type=int, default=50, help="Sliding window step used for the analysis (default: 50).")
+    parser.add_argument("--first_window", type=int, default=1, help="Number of the window starting at column 1 (default: 1).")
+    parser.add_argument("--tree", type=int, default=2, help="Tree whose p-AU is written to the bedGraph (default: 2).")
+    parser.add_argument("--ref_start", type=int, default=1, help="Reference position of alignment column 1, or offset added to the column map's positions (default: 1).")
+    parser.add_argument("--column_map", help="Optional TSV mapping alignment columns (first column) to reference positions, e.g. gap_remover_phyloP.py --coords_file output.")
+    parser.add_argument("--map_column", help="Column of --column_map holding the reference positions (default: the third column).")
+
+    args = parser.parse_args()
+    main(args)
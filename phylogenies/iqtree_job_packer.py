@@ -0,0 +1,224 @@
+"""
+Script title: iqtree_job_packer.py
+Author: Emmarie Alexander
+Contact: emmarie.alexander@tamu.edu
+Date written: 18-October-2026
+Date last updated: 18-October-2026
+Purpose: Run the IQ-TREE command lists used with tamulauncher (IQTREE-launcher.in, ../topology_tests/HRA_alternative_topology_tests.in) with a thread count chosen for each alignment, instead of '-nt AUTO' for every job.
+For each command, the alignment given with -s is read once to count species, sites and site patterns (distinct columns). IQ-TREE's likelihood work is split across threads by pattern, so each job gets
+'-T ceil(patterns / --patterns_per_thread)' threads (between 1 and --max_threads). Its cost is estimated as species x patterns, weighted by --search_weight for tree searches
+(commands without a fixed tree from -z/-te), and divided by its threads for its expected runtime. Sites are deliberately left out of the cost (rather than species x sites x patterns):
+identical columns are collapsed into one pattern before the likelihood is computed, so the work grows with patterns, not with sites times patterns.
+Jobs are then packed onto '--cores' cores largest-first: whenever cores free up, the most expensive waiting job that fits is started. Any job whose <prefix>.iqtree already exists is skipped,
+so an interrupted batch can simply be rerun. '--slurm_array' writes SLURM array scripts (one per thread count) instead of running anything, and '--dry_run' only prints the plan.
+Testing: '--iqtree' replaces the iqtree2 binary in every command, e.g. with a stub script.
+
+Example usage:
+python iqtree_job_packer.py --commands IQTREE-launcher.in --workdir ./IQTREE_trees --cores 20
+python iqtree_job_packer.py --commands ../topology_tests/HRA_alternative_topology_tests.in --workdir ./HRA_alternative_topology_tests --slurm_array HRA_topology_tests
+"""
+
+import argparse
+import math
+import os
+import shlex
+import subprocess
+import time
+
+import numpy as np
+
+THREAD_FLAGS = {"-nt", "-T", "--threads"}
+PREFIX_FLAGS = {"-pre", "--prefix"}
+
+
+def read_commands(commands_file):
+    """One argument list per non-empty, non-comment line of a tamulauncher .in file."""
+    with open(commands_file, "r") as f:
+        return [shlex.split(line) for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def option_value(command, flags):
+    for i, arg in enumerate(command[:-1]):
+        if arg in flags:
+            return command[i + 1]
+    return None
+
+
+def alignment_stats(alignment_file):
+    """(species, sites, site patterns) of a FASTA alignment."""
+    rows, sequence = [], []
+    with open(alignment_file, "rb") as f:
+        for line in f:
+            if line.startswith(b">"):
+                if sequence:
+                    rows.append(b"".join(sequence))
+                sequence = []
+            else:
+                sequence.append(line.strip())
+        if sequence:
+            rows.append(b"".join(sequence))
+    if not rows or len({len(row) for row in rows}) != 1:
+        raise ValueError(f"{alignment_file} is not an aligned FASTA (sequences are missing or have different lengths).")
+    columns = np.ascontiguousarray(np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(len(rows), -1).T)
+    # Each column viewed as one opaque value, so np.unique counts distinct columns
+    patterns = len(np.unique(columns.view(np.dtype((np.void, columns.shape[1]))).ravel()))
+    return len(rows), columns.shape[0], patterns
+
+
+def plan_jobs(commands, args):
+    """Work out each command's prefix, threads, cost and rewritten command line."""
+    stats_cache = {}
+    jobs = []
+    for command in commands:
+        alignment = option_value(command, {"-s"})
+        if alignment is None:
+            raise ValueError(f"No alignment (-s) in: {' '.join(command)}")
+        prefix = option_value(command, PREFIX_FLAGS) or alignment
+        if alignment not in stats_cache:
+            stats_cache[alignment] = alignment_stats(os.path.join(args.workdir, alignment))
+        n_species, n_sites, n_patterns = stats_cache[alignment]
+
+        threads = min(args.max_threads, args.cores, max(1, math.ceil(n_patterns / args.patterns_per_thread)))
+        fixed_tree = option_value(command, {"-z", "-te"}) is not None
+        cost = n_species * n_patterns * (1 if fixed_tree else args.search_weight)
+
+        # Drop any existing thread setting and ask for the planned number of threads explicitly
+        rewritten = []
+        skip_next = False
+        for arg in command:
+            if skip_next:
+                skip_next = False
+            elif arg in THREAD_FLAGS:
+                skip_next = True
+            else:
+                rewritten.append(arg)
+        if args.iqtree:
+            rewritten[0] = args.iqtree
+        rewritten += ["-T", str(threads)]
+
+        jobs.append({
+            "prefix": prefix, "alignment": alignment, "species": n_species, "sites": n_sites, "patterns": n_patterns,
+            "threads": threads, "cost": cost, "runtime": cost / threads, "command": rewritten,
+        })
+    return jobs
+
+
+def is_done(job, workdir):
+    return os.path.exists(os.path.join(workdir, f"{job['prefix']}.iqtree"))
+
+
+def run_jobs(jobs, args):
+    """Run the jobs on args.cores cores, largest expected runtime first, starting whatever fits as cores free up."""
+    pending = sorted(jobs, key=lambda job: -job["runtime"])
+    running = {}
+    failed = []
+    free_cores = args.cores
+    while pending or running:
+        for job in list(pending):
+            if job["threads"] <= free_cores:
+                pending.remove(job)
+                stdout = open(os.path.join(args.workdir, f"{job['prefix']}.packer.out"), "w")
+                try:
+                    process = subprocess.Popen(job["command"], cwd=args.workdir, stdout=stdout, stderr=subprocess.STDOUT)
+                except OSError as e:
+                    # e.g. a wrong --iqtree path; the job fails but the ones already running are still tracked
+                    stdout.close()
+                    failed.append(job["prefix"])
+                    print(f"{job['prefix']} failed to start ({type(e).__name__}: {e}).")
+                    continue
+                running[process] = (job, stdout, time.monotonic())
+                free_cores -= job["threads"]
+                print(f"Started {job['prefix']} with {job['threads']} threads ({free_cores} cores free, {len(pending)} waiting).")
+        time.sleep(args.poll_interval)
+        for process in [process for process in running if process.poll() is not None]:
+            job, stdout, started = running.pop(process)
+            stdout.close()
+            free_cores += job["threads"]
+            status = "finished" if process.returncode == 0 else f"failed (exit code {process.returncode})"
+            if process.returncode != 0:
+                failed.append(job["prefix"])
+            print(f"{job['prefix']} {status} after {time.monotonic() - started:.0f} s.")
+    return failed
+
+
+def write_slurm_arrays(jobs, args):
+    """One array script per thread count; each array task runs one command line from the matching .commands file."""
+    by_threads = {}
+    for job in sorted(jobs, key=lambda job: -job["runtime"]):
+        by_threads.setdefault(job["threads"], []).append(job)
+    for threads, group in sorted(by_threads.items()):
+        commands_file = f"{args.slurm_array}_T{threads}.commands"
+        with open(commands_file, "w") as f:
+            f.writelines(shlex.join(job["command"]) + "\n" for job in group)
+        script_file = f"{args.slurm_array}_T{threads}.slurm"
+        with open(script_file, "w") as f:
+            f.write(f"""#!/bin/bash
+
+#SBATCH --job-name={os.path.basename(args.slurm_array)}_T{threads}
+#SBATCH --time={args.slurm_time}
+#SBATCH --ntasks=1
+#SBATCH --cpus-per-task={threads}
+#SBATCH --mem={args.slurm_mem}
+#SBATCH --array=0-{len(group) - 1}
+#SBATCH --output=stdout.%x.%A_%a
+#SBATCH --error=stderr.%x.%A_%a
+
+module load GCC/11.3.0 OpenMPI/4.1.4 IQ-TREE/2.2.2.3
+
+export OMP_NUM_THREADS=$SLURM_CPUS_PER_TASK
+
+cd {shlex.quote(os.path.abspath(args.workdir))}
+
+COMMAND=$(sed -n "$((SLURM_ARRAY_TASK_ID + 1))p" {shlex.quote(os.path.abspath(commands_file))})
+# IQ-TREE names its output after -pre/--prefix, or after the alignment (-s) if no prefix is given
+PREFIX=$(echo "$COMMAND" | grep -oE -- '(-pre|--prefix) [^ ]+' | awk '{{print $2}}')
+[ -z "$PREFIX" ] && PREFIX=$(echo "$COMMAND" | grep -oE -- '-s [^ ]+' | awk '{{print $2}}')
+
+# Skip jobs that already finished
+if [ -e "$PREFIX.iqtree" ]; then
+    echo "$PREFIX.iqtree exists, skipping."
+    exit 0
+fi
+
+eval "$COMMAND"
+""")
+        print(f"Wrote {script_file} ({len(group)} jobs with {threads} threads each); submit with: sbatch {script_file}")
+
+
+def main(args):
+    jobs = plan_jobs(read_commands(args.commands), args)
+    done = [job for job in jobs if is_done(job, args.workdir)]
+    todo = [job for job in jobs if not is_done(job, args.workdir)]
+    print(f"{len(jobs)} jobs in {args.commands}: {len(done)} already have a .iqtree and are skipped, {len(todo)} to run.")
+
+    if args.dry_run or args.slurm_array:
+        print("prefix\tspecies\tsites\tpatterns\tthreads\tcost")
+        for job in sorted(todo, key=lambda job: -job["runtime"]):
+            print(f"{job['prefix']}\t{job['species']}\t{job['sites']}\t{job['patterns']}\t{job['threads']}\t{job['cost']}")
+        if args.slurm_array and todo:
+            write_slurm_arrays(todo, args)
+        return
+
+    failed = run_jobs(todo, args)
+    if failed:
+        print(f"{len(failed)} jobs failed: {', '.join(failed)}. Rerun to retry them; finished jobs will be skipped.")
+    print(f"Process complete! {len(todo) - len(failed)} of {len(todo)} jobs finished.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack IQ-TREE command lists onto the available cores with explicit, per-alignment thread counts.")
+    parser.add_argument("--commands", required=True, help="tamulauncher .in file with one iqtree2 command per line.")
+    parser.add_argument("--workdir", default=".", help="Directory the commands run in (where the alignments are); default: current directory.")
+    parser.add_argument("--cores", type=int, default=int(os.environ.get("SLURM_CPUS_ON_NODE", os.cpu_count())), help="Cores to pack jobs onto (default: $SLURM_CPUS_ON_NODE or all cores).")
+    parser.add_argument("--max_threads", type=int, default=16, help="Most threads given to one job (default: 16).")
+    parser.add_argument("--patterns_per_thread", type=int, default=1000, help="Site patterns per thread when choosing -T (default: 1000).")
+    parser.add_argument("--search_weight", type=float, default=10, help="Cost multiplier for tree searches relative to fixed-tree (-z/-te) runs (default: 10).")
+    parser.add_argument("--iqtree", help="Replace the iqtree2 binary in every command (e.g. a full path, or a stub for testing).")
+    parser.add_argument("--poll_interval", type=float, default=2, help="Seconds between checks for finished jobs (default: 2).")
+    parser.add_argument("--dry_run", action="store_true", help="Only print the planned threads and costs.")
+    parser.add_argument("--slurm_array", help="Write SLURM array scripts with this prefix instead of running the jobs.")
+    parser.add_argument("--slurm_time", default="2-00:00:00", help="Time limit per array task (default: 2-00:00:00).")
+    parser.add_argument("--slurm_mem", default="16G", help="Memory per array task (default: 16G).")
+
+    args = parser.parse_args()
+    main(args)
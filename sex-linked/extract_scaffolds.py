@@ -0,0 +1,109 @@
+"""
+Script title: extract_scaffolds.py
+Author: Emmarie Alexander
+Contact: emmarie.alexander@tamu.edu
+Date written: 18-October-2026
+Date last updated: 18-October-2026
+Purpose: Extract the putatively Y-linked scaffolds found with Winnowmap from every target genome in one job, instead of one 'seqkit grep -f' run per species.
+A manifest lists one (genome FASTA, header list, output FASTA) row per species. Genomes can be plain or gzipped (.fna.gz). Each genome is streamed once, line by line, and a record is kept if its ID is in the species' header set.
+As with seqkit grep, the ID is the first word of the header. Matching records are written as they are read, so the genome is never held in memory. Genomes are processed in parallel across a process pool.
+Header IDs that were not found are listed in <output>.missing.txt.
+
+Manifest format (tab-separated; a header row and lines starting with '#' are skipped):
+genome<TAB>headers<TAB>output
+./AilFul_GCA_002007465.1_unplacedScaf.fna<TAB>AilFul_chrY_scaffolds_toExtract.txt<TAB>AilFul_wm_chrY_scafs.fasta
+
+Example usage:
+python extract_scaffolds.py --manifest Y_scaffolds_manifest.tsv --threads 24
+"""
+
+import argparse
+import gzip
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def read_headers(header_file):
+    """Header IDs to extract, one per line (a leading '>' and anything after the first word are ignored)."""
+    with open(header_file, "r") as f:
+        return {line.lstrip(">").split()[0] for line in f if line.strip()}
+
+
+def open_genome(genome_file):
+    return gzip.open(genome_file, "rb") if genome_file.endswith(".gz") else open(genome_file, "rb", buffering=1 << 20)
+
+
+def extract_scaffolds(genome_file, header_file, output_file):
+    """Stream one genome and write the records whose ID is in header_file. Returns (output, records written, missing IDs)."""
+    wanted = {header.encode() for header in read_headers(header_file)}
+    found = set()
+    keep = False
+    with open_genome(genome_file) as genome, open(output_file, "wb") as out:
+        for line in genome:
+            if line.startswith(b">"):
+                fields = line[1:].split(None, 1)
+                record_id = fields[0] if fields else b""
+                keep = record_id in wanted
+                if keep:
+                    found.add(record_id)
+            if keep:
+                out.write(line)
+
+    missing = sorted(header.decode() for header in wanted - found)
+    if missing:
+        with open(f"{output_file}.missing.txt", "w") as f:
+            f.writelines(f"{header}\n" for header in missing)
+    return output_file, len(found), missing
+
+
+def read_manifest(manifest_file):
+    with open(manifest_file, "r") as f:
+        rows = [line.rstrip("\n").split("\t") for line in f if line.strip() and not line.startswith("#")]
+    if rows and rows[0][0] == "genome":  # Skip the header row
+        rows = rows[1:]
+    bad_rows = [i + 1 for i, row in enumerate(rows) if len(row) < 3]
+    if bad_rows:
+        raise ValueError(f"Manifest rows need genome, headers and output columns (check rows {bad_rows[:5]}).")
+    return [tuple(row[:3]) for row in rows]
+
+
+def main(args):
+    if args.manifest:
+        jobs = read_manifest(args.manifest)
+    else:
+        jobs = [(args.genome, args.headers, args.output)]
+
+    if not jobs:
+        print(f"No genomes were listed in {args.manifest}; nothing to extract.")
+        return
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=min(args.threads, len(jobs))) as pool:
+        futures = {pool.submit(extract_scaffolds, *job): job for job in jobs}
+        for future in as_completed(futures):
+            genome_file = futures[future][0]
+            try:
+                output_file, n_found, missing = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Failed: {genome_file} ({type(e).__name__}: {e})")
+                continue
+            print(f"{genome_file}: {n_found} scaffolds written to {output_file}.")
+            if missing:
+                print(f"  Warning: {len(missing)} headers were not found; see {output_file}.missing.txt")
+
+    print(f"Process complete! {len(jobs) - failed} of {len(jobs)} genomes extracted.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract listed scaffolds from one or many (optionally gzipped) genome FASTA files in a single pass each.")
+    parser.add_argument("--manifest", help="TSV of genome, headers and output columns, one row per species.")
+    parser.add_argument("--genome", help="Genome FASTA (.fna/.fasta, optionally .gz) for a single species.")
+    parser.add_argument("--headers", help="Text file of scaffold headers to extract for a single species.")
+    parser.add_argument("--output", help="Output FASTA for a single species.")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="Number of genomes to process in parallel (default: all cores).")
+
+    args = parser.parse_args()
+    if not args.manifest and not all([args.genome, args.headers, args.output]):
+        parser.error("Give either --manifest, or all of --genome, --headers and --output.")
+    main(args)